@@ -1,12 +1,87 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 class Settings(BaseSettings):
     mongodb_url: str
-    gemini_api_key: str
+    # Connection pool, timeouts (milliseconds) and read preference of the MongoDB client.
+    # Reads from secondaries may lag writes, so keep "primary" unless reads can be stale.
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_max_idle_time_ms: Optional[int] = None
+    mongodb_connect_timeout_ms: int = 5000
+    mongodb_server_selection_timeout_ms: int = 5000
+    mongodb_socket_timeout_ms: Optional[int] = None
+    mongodb_wait_queue_timeout_ms: Optional[int] = None
+    mongodb_read_preference: str = "primary"
+    # Create missing indexes on startup; disable to manage them with `python -m app.migrate indexes`
+    mongodb_ensure_indexes: bool = True
+    gemini_api_key: str = ""
+    # Model backend: "gemini" or "fake" (local, no network, for load testing)
+    llm_provider: str = "gemini"
+    gemini_model: str = "gemini-2.0-flash"
+    fake_llm_latency_mean: float = 0.2
+    fake_llm_latency_stddev: float = 0.05
+    fake_llm_stream_chunks: int = 8
+    fake_llm_error_rate: float = 0.0
+    fake_llm_error_code: int = 429
+    fake_llm_seed: Optional[int] = None
     jwt_secret_key: str = "your-secret-key"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # Bounds on the history sent to Gemini for bot replies
+    context_max_messages: int = 50
+    context_max_chars: int = 12000
+    # Number of background workers draining the summarization job queue
+    summary_workers: int = 4
+    # A running job not renewed within the lease is taken over; finished jobs expire after the retention
+    summary_job_lease_seconds: int = 300
+    summary_job_retention_days: Optional[int] = 7
+    # Cache and coordination backend: "memory" (per process) or "redis" (shared)
+    cache_backend: str = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    redis_pool_size: int = 4
+    shared_cache_ttl: int = 3600
+    summarize_lock_ttl: int = 120
+    # Scheduling of Gemini calls: rate limit, concurrency cap, deadline and retries
+    llm_rate_per_second: float = 10.0
+    llm_burst: int = 20
+    llm_max_in_flight: int = 8
+    llm_timeout: float = 60.0
+    llm_max_attempts: int = 4
+    # Recent-message cache: total memory bound and messages kept per conversation
+    message_cache_bytes: int = 64 * 1024 * 1024
+    message_cache_per_conversation: int = 200
+    # In-process cache of Gemini results
+    result_cache_size: int = 1024
+    result_cache_ttl: int = 3600
+    # Conversations longer than one chunk are summarized chunk by chunk, then reduced
+    summary_chunk_tokens: int = 6000
+    summary_chunk_concurrency: int = 4
+    # Background summaries of conversations idle for presummary_idle_seconds, checked every presummary_interval seconds
+    presummary_enabled: bool = True
+    presummary_idle_seconds: int = 300
+    presummary_interval: float = 60.0
+    presummary_batch_size: int = 20
+    presummary_concurrency: int = 2
+    # A failed background summary is retried after presummary_interval, doubling per failure up to this many seconds
+    presummary_max_backoff: int = 24 * 60 * 60
+    # Background purge of deleted conversations: messages per batch, pause between batches,
+    # polling interval and how long a process holds a purge before others may take it over
+    purge_batch_size: int = 1000
+    purge_batch_pause: float = 0.05
+    purge_interval: float = 30.0
+    purge_lease_seconds: int = 120
+    # Retention through TTL indexes; None keeps documents forever
+    message_retention_days: Optional[int] = None
+    summary_retention_days: Optional[int] = None
+    # Summaries kept in the per-conversation sentiment trend
+    stats_sentiment_trend_size: int = 20
+    # Cursor batch size and rows per chunk for streamed NDJSON exports
+    stream_batch_size: int = 1000
+    stream_chunk_rows: int = 100
+    # Records validated and written per insert_many call during bulk imports
+    bulk_chunk_size: int = 1000
 
     class Config:
         env_file = ".env"
@@ -15,4 +90,9 @@ class Settings(BaseSettings):
 def get_settings() -> Settings:
     return Settings()
 
-settings = get_settings()
\ No newline at end of file
+class LazySettings:
+    # Reads the environment on first use instead of at import time
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+settings = LazySettings()
\ No newline at end of file
@@ -1,25 +1,132 @@
+import asyncio
+from typing import Dict, List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
 from .config import settings
+from .metrics import CommandMetrics
+
+# Indexes for better query performance, by collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    'messages': [
+        IndexModel([('conversation_id', 1)]),
+        IndexModel([('conversation_id', 1), ('_id', -1)]),
+        IndexModel([('user_id', 1)]),
+        IndexModel([('user_id', 1), ('timestamp', -1), ('_id', -1)]),
+        IndexModel([('timestamp', -1)]),
+        # Word search within a conversation and across a user's conversations
+        IndexModel([('conversation_id', 1), ('terms', 1)]),
+        IndexModel([('user_id', 1), ('terms', 1)]),
+    ],
+    'summaries': [
+        IndexModel([('conversation_id', 1)]),
+        IndexModel([('conversation_id', 1), ('created_at', -1)]),
+        IndexModel([('cache_keys.summary', 1)], sparse=True),
+        IndexModel([('cache_keys.analysis', 1)], sparse=True),
+    ],
+    'summary_chunks': [
+        IndexModel([('conversation_id', 1)]),
+    ],
+    'conversation_stats': [
+        IndexModel([('last_message_at', 1)]),
+        IndexModel([('first_message_at', 1)]),
+    ],
+    'user_stats': [
+        IndexModel([('first_message_at', 1)]),
+    ],
+    'deleted_conversations': [
+        IndexModel([('claimed_until', 1)]),
+        IndexModel([('user_ids', 1)]),
+    ],
+    'summary_jobs': [
+        IndexModel([('dedup_key', 1)], unique=True),
+        IndexModel([('status', 1)]),
+    ],
+}
+
+# Retention by TTL index: collection -> (date field, setting with the retention in days)
+TTL_INDEXES = {
+    'messages': ('timestamp', 'message_retention_days'),
+    'summaries': ('created_at', 'summary_retention_days'),
+    'summary_chunks': ('created_at', 'summary_retention_days'),
+    'summary_jobs': ('updated_at', 'summary_job_retention_days'),
+}
 
 class Database:
     client: AsyncIOMotorClient = None
     db = None
+    _lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    async def connect_db(cls, ensure_indexes: Optional[bool] = None):
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+
+        # Concurrent first requests share one client
+        async with cls._lock:
+            if cls.client:
+                return
+
+            options = {
+                'maxPoolSize': settings.mongodb_max_pool_size,
+                'minPoolSize': settings.mongodb_min_pool_size,
+                'maxIdleTimeMS': settings.mongodb_max_idle_time_ms,
+                'connectTimeoutMS': settings.mongodb_connect_timeout_ms,
+                'serverSelectionTimeoutMS': settings.mongodb_server_selection_timeout_ms,
+                'socketTimeoutMS': settings.mongodb_socket_timeout_ms,
+                'waitQueueTimeoutMS': settings.mongodb_wait_queue_timeout_ms,
+                'readPreference': settings.mongodb_read_preference,
+            }
+            client = AsyncIOMotorClient(
+                settings.mongodb_url,
+                event_listeners=[CommandMetrics()],
+                **{name: value for name, value in options.items() if value is not None}
+            )
+            cls.db = client.chat_db
+            if ensure_indexes is None:
+                ensure_indexes = settings.mongodb_ensure_indexes
+            if ensure_indexes:
+                await cls.ensure_indexes()
+            cls.client = client
 
     @classmethod
-    async def connect_db(cls):
-        cls.client = AsyncIOMotorClient(settings.mongodb_url)
-        cls.db = cls.client.chat_db
-        
-        # Create indexes for better query performance
-        await cls.db.messages.create_index([('conversation_id', 1)])
-        await cls.db.messages.create_index([('user_id', 1)])
-        await cls.db.messages.create_index([('timestamp', -1)])
-        await cls.db.summaries.create_index([('conversation_id', 1)])
+    async def ensure_indexes(cls) -> List[str]:
+        # One listIndexes per collection, then one createIndexes for whatever is missing
+        async def ensure(collection_name: str, indexes: List[IndexModel]) -> List[str]:
+            collection = cls.db[collection_name]
+            existing = {index['name']: index async for index in collection.list_indexes()}
+            missing = [index for index in indexes if index.document['name'] not in existing]
+            created = await collection.create_indexes(missing) if missing else []
+            if collection_name in TTL_INDEXES:
+                created += await cls._ensure_ttl(collection, existing, *TTL_INDEXES[collection_name])
+            return created
+
+        created = await asyncio.gather(*[ensure(name, indexes) for name, indexes in INDEXES.items()])
+        return [name for names in created for name in names]
+
+    @classmethod
+    async def _ensure_ttl(cls, collection, existing: Dict[str, Dict], field: str, setting: str) -> List[str]:
+        # The server expires documents once the date in `field` is older than the retention
+        days = getattr(settings, setting)
+        name = f"{field}_ttl"
+        current = existing.get(name)
+        if days is None:
+            if current:
+                await collection.drop_index(name)
+            return []
+
+        seconds = days * 24 * 60 * 60
+        if current is None:
+            return await collection.create_indexes([IndexModel([(field, 1)], name=name, expireAfterSeconds=seconds)])
+        if current.get('expireAfterSeconds') != seconds:
+            await cls.db.command('collMod', collection.name, index={'name': name, 'expireAfterSeconds': seconds})
+        return []
 
     @classmethod
     async def close_db(cls):
         if cls.client:
-            await cls.client.close()
+            cls.client.close()
+            cls.client = None
+            cls.db = None
 
     @classmethod
     async def get_db(cls):
@@ -27,4 +134,4 @@ class Database:
             await cls.connect_db()
         return cls.db
 
-db = Database()
\ No newline at end of file
+db = Database()
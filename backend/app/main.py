@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from .database import db
+from .metrics import CACHE_HIT_RATE, LLM_IN_FLIGHT, LLM_QUEUED, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, registry, span
 from .routes import chat
+from .services.chat_service import chat_service
+from .services.gemini_service import gemini_service
+from .services.job_service import job_service
+from .services.presummary_service import presummary_service
+from .services.purge_service import purge_service
 
 app = FastAPI(
     title="Chat Summarization and Insights API",
@@ -22,14 +30,51 @@ app.add_middleware(
 # Include routers
 app.include_router(chat.router)
 
+# Values read from the services at scrape time
+LLM_IN_FLIGHT.set_function(lambda: gemini_service.scheduler.stats()['in_flight'])
+LLM_QUEUED.set_function(lambda: gemini_service.scheduler.stats()['queued'])
+CACHE_HIT_RATE.set_function(lambda: chat_service.message_cache_stats()['hit_rate'], cache='messages')
+CACHE_HIT_RATE.set_function(lambda: gemini_service.cache.stats()['hit_rate'], cache='results')
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        with span('http.request', method=request.method, path=request.url.path):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template so ids in the path do not create new series
+        route = request.scope.get('route')
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else 'unmatched',
+            status=status
+        )
+
 @app.on_event("startup")
 async def startup_event():
     await db.connect_db()
+    await job_service.start()
+    await presummary_service.start()
+    await purge_service.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await purge_service.stop()
+    await presummary_service.stop()
+    await job_service.stop()
     await db.close_db()
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Chat Summarization and Insights API"}
\ No newline at end of file
@@ -0,0 +1,220 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Sequence, Tuple
+from pymongo import monitoring
+
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("chat-summarization")
+except ImportError:
+    _tracer = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+def _format_labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+class Metric(ABC):
+    type = 'untyped'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        # Motor runs pymongo and its listeners on worker threads
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in items]
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        # Evaluated at scrape time
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            values[key] = function()
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in values.items()]
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = []
+        for key, (counts, count, total) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names + ('le',), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.label_names + ('le',), key + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time to produce the response headers, by route', ['method', 'route', 'status']
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge('http_requests_in_flight', 'HTTP requests being processed'))
+DB_LATENCY = registry.register(Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency', ['command', 'collection']
+))
+DB_DOCUMENTS = registry.register(Counter(
+    'mongodb_documents_returned_total', 'Documents returned or written by MongoDB commands', ['command', 'collection']
+))
+DB_FAILURES = registry.register(Counter('mongodb_command_failures_total', 'Failed MongoDB commands', ['command']))
+LLM_LATENCY = registry.register(Histogram(
+    'llm_request_duration_seconds', 'Model call latency including scheduling and retries', ['operation', 'outcome']
+))
+LLM_PROMPT_CHARS = registry.register(Histogram(
+    'llm_prompt_characters', 'Prompt size sent to the model', ['operation'], SIZE_BUCKETS
+))
+LLM_RESPONSE_CHARS = registry.register(Histogram(
+    'llm_response_characters', 'Response size returned by the model', ['operation'], SIZE_BUCKETS
+))
+LLM_IN_FLIGHT = registry.register(Gauge('llm_requests_in_flight', 'Model calls holding a scheduler slot'))
+LLM_QUEUED = registry.register(Gauge('llm_requests_queued', 'Model calls waiting for a scheduler slot'))
+CACHE_HIT_RATE = registry.register(Gauge('cache_hit_rate', 'Hit rate since startup', ['cache']))
+PRESUMMARIES = registry.register(Counter(
+    'presummaries_total', 'Background summaries of idle conversations', ['outcome']
+))
+PURGES = registry.register(Counter(
+    'purges_total', 'Background purges of deleted conversations', ['outcome']
+))
+
+def span(name: str, **attributes):
+    # OpenTelemetry span when the SDK is installed, otherwise a no-op
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._collections: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        key = 'collection' if event.command_name == 'getMore' else event.command_name
+        collection = event.command.get(key)
+        with self._lock:
+            self._collections[event.request_id] = collection if isinstance(collection, str) else ''
+
+    def _collection(self, event) -> str:
+        with self._lock:
+            return self._collections.pop(event.request_id, '')
+
+    def succeeded(self, event):
+        collection = self._collection(event)
+        DB_LATENCY.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+
+        reply = event.reply
+        cursor = reply.get('cursor')
+        if isinstance(cursor, dict):
+            documents = len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+        else:
+            documents = reply.get('n', 0)
+        if documents:
+            DB_DOCUMENTS.inc(documents, command=event.command_name, collection=collection)
+
+    def failed(self, event):
+        self._collection(event)
+        DB_FAILURES.inc(command=event.command_name)
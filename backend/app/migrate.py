@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+from datetime import datetime
+from pymongo import UpdateOne
+from .config import settings
+from .database import db
+from .services.search_index import search_terms
+from .services.stats_service import stats_service
+
+async def create_indexes():
+    await db.connect_db(ensure_indexes=False)
+    try:
+        created = await db.ensure_indexes()
+        print(f"Created indexes: {', '.join(created)}" if created else "All indexes exist")
+    finally:
+        await db.close_db()
+
+async def rebuild_stats():
+    await db.connect_db()
+    try:
+        await stats_service.rebuild()
+    finally:
+        await db.close_db()
+
+# Fields that older versions could store as ISO strings instead of BSON dates
+DATETIME_FIELDS = {
+    'messages': ['timestamp'],
+    'summaries': ['created_at', 'last_message_timestamp'],
+}
+
+async def convert_datetimes():
+    await db.connect_db(ensure_indexes=False)
+    try:
+        db_instance = await db.get_db()
+        for collection_name, fields in DATETIME_FIELDS.items():
+            collection = db_instance[collection_name]
+            for field in fields:
+                converted, skipped, last_id = 0, 0, None
+                
+                # Walk string values in _id order, one bounded batch at a time
+                while True:
+                    query = {field: {'$type': 'string'}}
+                    if last_id is not None:
+                        query['_id'] = {'$gt': last_id}
+                    docs = await collection.find(query, {field: 1}).sort('_id', 1).limit(settings.bulk_chunk_size).to_list(None)
+                    if not docs:
+                        break
+                    last_id = docs[-1]['_id']
+                    
+                    updates = []
+                    for doc in docs:
+                        try:
+                            # Strings without an offset are taken as UTC
+                            value = datetime.fromisoformat(doc[field])
+                        except ValueError:
+                            skipped += 1
+                            continue
+                        updates.append(UpdateOne({'_id': doc['_id'], field: doc[field]}, {'$set': {field: value}}))
+                    if updates:
+                        result = await collection.bulk_write(updates, ordered=False)
+                        converted += result.modified_count
+                
+                print(f"{collection_name}.{field}: converted {converted}, unparseable {skipped}")
+    finally:
+        await db.close_db()
+
+async def index_search_terms():
+    await db.connect_db()
+    try:
+        db_instance = await db.get_db()
+        indexed, last_id = 0, None
+        
+        # Messages written before word search have no terms; fill them in bounded batches
+        while True:
+            query = {'terms': {'$exists': False}}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            docs = await db_instance.messages.find(query, {'message': 1}).sort('_id', 1).limit(settings.bulk_chunk_size).to_list(None)
+            if not docs:
+                break
+            last_id = docs[-1]['_id']
+            result = await db_instance.messages.bulk_write(
+                [UpdateOne({'_id': doc['_id']}, {'$set': {'terms': search_terms(doc.get('message', ''))}}) for doc in docs],
+                ordered=False
+            )
+            indexed += result.modified_count
+        print(f"messages: indexed {indexed}")
+        
+        # The text index of earlier versions is no longer queried
+        if 'message_text' in await db_instance.messages.index_information():
+            await db_instance.messages.drop_index('message_text')
+            print("Dropped index message_text")
+    finally:
+        await db.close_db()
+
+COMMANDS = {
+    'datetimes': convert_datetimes,
+    'indexes': create_indexes,
+    'rebuild-stats': rebuild_stats,
+    'search-terms': index_search_terms
+}
+
+if __name__ == '__main__':
+    # Run from the backend directory: python -m app.migrate indexes|datetimes|rebuild-stats|search-terms
+    parser = argparse.ArgumentParser(description="Database maintenance tasks")
+    parser.add_argument('command', choices=COMMANDS)
+    args = parser.parse_args()
+    asyncio.run(COMMANDS[args.command]())
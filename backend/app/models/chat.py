@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Literal
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
@@ -31,6 +31,34 @@ class ChatMessage(BaseModel):
         populate_by_name = True
         allow_population_by_field_name = True
 
+class MessageRow:
+    # Unvalidated row for internal read paths that only need the message fields
+    __slots__ = ('id', 'conversation_id', 'user_id', 'message', 'timestamp')
+
+    # Fields to project when reading rows
+    PROJECTION = {'conversation_id': 1, 'user_id': 1, 'message': 1, 'timestamp': 1}
+
+    def __init__(
+        self,
+        id: Optional[str],
+        conversation_id: str,
+        user_id: str,
+        message: str,
+        timestamp: Optional[datetime] = None
+    ):
+        self.id = id
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.message = message
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_doc(cls, doc: Dict) -> 'MessageRow':
+        return cls(str(doc['_id']), doc['conversation_id'], doc['user_id'], doc['message'], doc.get('timestamp'))
+
+class SearchResult(ChatMessage):
+    score: float
+
 class ChatSummary(BaseModel):
     id: Optional[PyObjectId] = Field(alias='_id')
     conversation_id: str
@@ -38,18 +66,76 @@ class ChatSummary(BaseModel):
     sentiment: Optional[str] = None
     keywords: List[str] = Field(default_factory=list)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Watermark of the last message covered by this summary
+    last_message_id: Optional[str] = None
+    last_message_timestamp: Optional[datetime] = None
 
     class Config:
         json_encoders = {ObjectId: str}
         populate_by_name = True
 
+class SentimentPoint(BaseModel):
+    summary_id: str
+    sentiment: str
+    created_at: datetime
+
+class ConversationStats(BaseModel):
+    conversation_id: str
+    message_count: int = 0
+    first_message_at: Optional[datetime] = None
+    last_message_at: Optional[datetime] = None
+    participants: List[str] = Field(default_factory=list)
+    last_summary_id: Optional[str] = None
+    # Sentiment of the most recent summaries, oldest first
+    sentiment_trend: List[SentimentPoint] = Field(default_factory=list)
+
+class UserStats(BaseModel):
+    user_id: str
+    message_count: int = 0
+    first_message_at: Optional[datetime] = None
+    last_message_at: Optional[datetime] = None
+
+class SentimentAnalysis(BaseModel):
+    sentiment: Literal['positive', 'negative', 'neutral']
+    keywords: List[str]
+
+class ConversationAnalysis(SentimentAnalysis):
+    summary: str
+
 class PaginatedResponse(BaseModel):
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     limit: int
     data: List[ChatMessage]
+    next_cursor: Optional[str] = None
+
+class BulkInsertError(BaseModel):
+    index: int
+    error: str
+
+class BulkInsertResult(BaseModel):
+    received: int
+    inserted: int
+    errors: List[BulkInsertError] = Field(default_factory=list)
 
 class ChatSummarizeRequest(BaseModel):
     conversation_id: str
     include_sentiment: bool = False
-    include_keywords: bool = False
\ No newline at end of file
+    include_keywords: bool = False
+    incremental: bool = False
+
+class SummaryJob(BaseModel):
+    id: Optional[PyObjectId] = Field(default=None, alias='_id')
+    conversation_id: str
+    status: str = 'pending'
+    include_sentiment: bool = False
+    include_keywords: bool = False
+    incremental: bool = False
+    result: Optional[ChatSummary] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        json_encoders = {ObjectId: str}
+        populate_by_name = True
\ No newline at end of file
@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException, Query
+import json
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
-from ..models.chat import ChatMessage, ChatSummary, ChatSummarizeRequest, PaginatedResponse
+from ..models.chat import (
+    BulkInsertResult, ChatMessage, ChatSummary, ChatSummarizeRequest, ConversationStats,
+    PaginatedResponse, SearchResult, SummaryJob, UserStats
+)
 from ..services.chat_service import chat_service
+from ..services.gemini_service import gemini_service
+from ..services.job_service import job_service
+from ..services.llm_scheduler import ModelOverloadedError, ModelResponseError, ModelTimeoutError
+from ..services.stats_service import stats_service
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 
@@ -10,22 +19,50 @@ router = APIRouter(prefix="/chats", tags=["chats"])
 async def create_chat_message(message: ChatMessage):
     try:
         return await chat_service.create_message(message)
+    except ModelOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ModelTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{conversation_id}", response_model=List[ChatMessage])
 async def get_conversation(
     conversation_id: str,
+    request: Request,
+    response: Response,
     search_query: Optional[str] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    since: Optional[str] = None,
+    stream: bool = False
 ):
+    # Stream NDJSON rows as they are read instead of building the full list
+    if stream or 'application/x-ndjson' in request.headers.get('accept', ''):
+        return StreamingResponse(
+            chat_service.stream_messages(
+                conversation_id,
+                search_query=search_query,
+                start_date=start_date,
+                end_date=end_date
+            ),
+            media_type='application/x-ndjson'
+        )
+    
     try:
+        # Clients holding the current state get an empty 304 instead of the messages again
+        etag = await chat_service.conversation_etag(conversation_id)
+        if etag in request.headers.get('if-none-match', ''):
+            return Response(status_code=304, headers={'ETag': etag})
+        response.headers['ETag'] = etag
+        
+        # `since` is the id of the newest message the client has; only later ones are returned
         messages = await chat_service.get_message(
             conversation_id,
             search_query=search_query,
             start_date=start_date,
-            end_date=end_date
+            end_date=end_date,
+            after_id=since
         )
         return messages
     except ValueError as e:
@@ -33,14 +70,121 @@ async def get_conversation(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _ndjson_lines(request: Request):
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+async def _json_records(records: list):
+    for record in records:
+        yield record
+
+@router.post("/bulk", response_model=BulkInsertResult)
+async def bulk_create_chat_messages(request: Request):
+    # Accept either an NDJSON stream or a JSON array of messages
+    if 'application/x-ndjson' in request.headers.get('content-type', ''):
+        records = _ndjson_lines(request)
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+        records = _json_records(body)
+    
+    try:
+        return await chat_service.bulk_create_messages(records)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/stream")
+async def stream_chat_message(message: ChatMessage):
+    async def events():
+        try:
+            async for event in chat_service.stream_reply(message):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(events(), media_type='text/event-stream')
+
+@router.websocket("/ws/{client_id}")
+async def chat_websocket(websocket: WebSocket, client_id: str):
+    await websocket.accept()
+    try:
+        while True:
+            data = await websocket.receive_json()
+            data.setdefault('user_id', client_id)
+            try:
+                message = ChatMessage(**data)
+                async for event in chat_service.stream_reply(message):
+                    await websocket.send_json(event)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await websocket.send_json({'event': 'error', 'data': {'detail': str(e)}})
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        'messages': chat_service.message_cache_stats(),
+        'results': gemini_service.cache.stats(),
+        'scheduler': gemini_service.scheduler.stats()
+    }
+
+# Stats are precomputed rollups, so each request is a single document read
+@router.get("/{conversation_id}/stats", response_model=ConversationStats)
+async def get_conversation_stats(conversation_id: str):
+    try:
+        stats = await stats_service.get_conversation_stats(conversation_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not stats:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return stats
+
+@router.get("/users/{user_id}/stats", response_model=UserStats)
+async def get_user_stats(user_id: str):
+    try:
+        stats = await stats_service.get_user_stats(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not stats:
+        raise HTTPException(status_code=404, detail="User not found")
+    return stats
+
 @router.get("/users/{user_id}/messages", response_model=PaginatedResponse)
 async def get_user_messages(
     user_id: str,
     page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = None,
+    include_total: bool = False
 ):
     try:
-        return await chat_service.get_user_messages(user_id, page, limit)
+        return await chat_service.get_user_messages(user_id, page, limit, after, include_total)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/users/{user_id}/search", response_model=List[SearchResult])
+async def search_user_messages(
+    user_id: str,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100)
+):
+    try:
+        return await chat_service.search_user_messages(user_id, q, limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -50,12 +194,38 @@ async def summarize_chat(request: ChatSummarizeRequest):
         return await chat_service.summarize_conversation(
             request.conversation_id,
             request.include_sentiment,
-            request.include_keywords
+            request.include_keywords,
+            request.incremental
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ModelOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ModelTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ModelResponseError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/summarize/jobs", response_model=SummaryJob, status_code=202)
+async def submit_summary_job(request: ChatSummarizeRequest):
+    try:
+        return await job_service.submit(request)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/summarize/{job_id}", response_model=SummaryJob)
+async def get_summary_job(job_id: str):
+    try:
+        job = await job_service.get_job(job_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="Summary job not found")
+    return job
 
 @router.delete("/{conversation_id}")
 async def delete_conversation(conversation_id: str):
@@ -0,0 +1,296 @@
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from ..config import settings
+
+class CacheBackendError(Exception):
+    pass
+
+class CacheBackend(ABC):
+    # Whether state is visible to other worker processes
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    async def rpush(self, key: str, *values: str) -> int:
+        ...
+
+    @abstractmethod
+    async def replace_list(self, key: str, values: List[str], ttl: int, state_key: str, state: str):
+        # Atomically replaces the list and sets its companion state key, both expiring after ttl
+        ...
+
+    @abstractmethod
+    async def ltrim(self, key: str, start: int, stop: int):
+        ...
+
+    @abstractmethod
+    async def lrange(self, key: str, start: int, stop: int) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def expire(self, key: str, ttl: int):
+        ...
+
+    @abstractmethod
+    async def acquire_lock(self, key: str, ttl: int) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def release_lock(self, key: str, token: str):
+        ...
+
+    @asynccontextmanager
+    async def lock(self, key: str, ttl: int, timeout: Optional[float] = None, poll_interval: float = 0.1):
+        deadline = time.monotonic() + (timeout if timeout is not None else ttl)
+        token = await self.acquire_lock(key, ttl)
+        while token is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for lock {key}")
+            await asyncio.sleep(poll_interval)
+            token = await self.acquire_lock(key, ttl)
+        try:
+            yield
+        finally:
+            await self.release_lock(key, token)
+
+class MemoryBackend(CacheBackend):
+    def __init__(self):
+        # key -> (expires_at or None, value)
+        self._data: Dict[str, Tuple[Optional[float], object]] = {}
+
+    def _get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _expires_at(self, ttl: Optional[int]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl else None
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        self._data[key] = (self._expires_at(ttl), value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        current = self._get(key)
+        # Like redis, the counter keeps its expiry
+        expires_at = self._data[key][0] if current is not None else None
+        value = int(current or 0) + 1
+        self._data[key] = (expires_at, str(value))
+        return value
+
+    async def rpush(self, key: str, *values: str) -> int:
+        items = self._get(key)
+        if items is None:
+            items = []
+            self._data[key] = (None, items)
+        items.extend(values)
+        return len(items)
+
+    async def replace_list(self, key: str, values: List[str], ttl: int, state_key: str, state: str):
+        # No await in between, so no other task sees a partial replace
+        if values:
+            self._data[key] = (self._expires_at(ttl), list(values))
+        else:
+            self._data.pop(key, None)
+        self._data[state_key] = (self._expires_at(ttl), state)
+
+    @staticmethod
+    def _slice(items: List[str], start: int, stop: int) -> List[str]:
+        # Redis ranges include the stop index
+        stop = stop + 1 if stop >= 0 else len(items) + stop + 1
+        return items[start:stop]
+
+    async def ltrim(self, key: str, start: int, stop: int):
+        items = self._get(key)
+        if items is not None:
+            items[:] = self._slice(items, start, stop)
+
+    async def lrange(self, key: str, start: int, stop: int) -> List[str]:
+        return list(self._slice(self._get(key) or [], start, stop))
+
+    async def expire(self, key: str, ttl: int):
+        value = self._get(key)
+        if value is not None:
+            self._data[key] = (self._expires_at(ttl), value)
+
+    async def acquire_lock(self, key: str, ttl: int) -> Optional[str]:
+        if self._get(key) is not None:
+            return None
+        token = uuid.uuid4().hex
+        await self.set(key, token, ttl)
+        return token
+
+    async def release_lock(self, key: str, token: str):
+        if self._get(key) == token:
+            del self._data[key]
+
+# Deletes the lock only if it is still held by the caller
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+# Replaces a list and sets its state key in one step; pushes in slices to stay within Lua's stack
+REPLACE_LIST_SCRIPT = (
+    "redis.call('del', KEYS[1]) "
+    "for i = 3, #ARGV, 1000 do redis.call('rpush', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV))) end "
+    "if #ARGV > 2 then redis.call('expire', KEYS[1], ARGV[1]) end "
+    "redis.call('set', KEYS[2], ARGV[2], 'EX', ARGV[1]) "
+    "return 1"
+)
+
+class RedisBackend(CacheBackend):
+    shared = True
+
+    def __init__(self, url: str, pool_size: int = 4):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db_index = int(parsed.path.lstrip('/') or 0)
+        # Idle connections; each carries one command at a time, at most pool_size at once
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def execute(self, *args):
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await self._connect()
+                result = await self._command(connection, *args)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self._discard(connection)
+                raise CacheBackendError(f"Lost connection to {self.host}:{self.port}")
+            except BaseException:
+                # Cancelled or failed mid-reply: what is left of the reply would be read by the
+                # next command, so the connection is not reused
+                self._discard(connection)
+                raise
+            self._idle.append(connection)
+            return result
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        connection = await asyncio.open_connection(self.host, self.port)
+        try:
+            if self.password:
+                await self._command(connection, 'AUTH', self.password)
+            if self.db_index:
+                await self._command(connection, 'SELECT', self.db_index)
+        except BaseException:
+            self._discard(connection)
+            raise
+        return connection
+
+    @staticmethod
+    def _discard(connection):
+        if connection is not None:
+            connection[1].close()
+
+    async def _command(self, connection, *args):
+        reader, writer = connection
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        writer.write(b''.join(parts))
+        await writer.drain()
+        return await self._read_reply(reader)
+
+    async def _read_reply(self, reader: asyncio.StreamReader):
+        line = await reader.readuntil(b"\r\n")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b'+':
+            return payload.decode()
+        if prefix == b'-':
+            raise CacheBackendError(payload.decode())
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if prefix == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [await self._read_reply(reader) for _ in range(length)]
+        raise CacheBackendError(f"Unexpected reply: {line!r}")
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.execute('GET', key)
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        if ttl:
+            await self.execute('SET', key, value, 'EX', ttl)
+        else:
+            await self.execute('SET', key, value)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.execute('DEL', *keys)
+
+    async def incr(self, key: str) -> int:
+        return await self.execute('INCR', key)
+
+    async def rpush(self, key: str, *values: str) -> int:
+        return await self.execute('RPUSH', key, *values)
+
+    async def replace_list(self, key: str, values: List[str], ttl: int, state_key: str, state: str):
+        await self.execute('EVAL', REPLACE_LIST_SCRIPT, 2, key, state_key, ttl, state, *values)
+
+    async def ltrim(self, key: str, start: int, stop: int):
+        await self.execute('LTRIM', key, start, stop)
+
+    async def lrange(self, key: str, start: int, stop: int) -> List[str]:
+        return await self.execute('LRANGE', key, start, stop)
+
+    async def expire(self, key: str, ttl: int):
+        await self.execute('EXPIRE', key, ttl)
+
+    async def acquire_lock(self, key: str, ttl: int) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self.execute('SET', key, token, 'NX', 'EX', ttl)
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str):
+        await self.execute('EVAL', RELEASE_LOCK_SCRIPT, 1, key, token)
+
+@lru_cache()
+def get_cache_backend() -> CacheBackend:
+    if settings.cache_backend == 'redis':
+        return RedisBackend(settings.redis_url, settings.redis_pool_size)
+    if settings.cache_backend == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Unknown cache backend: {settings.cache_backend}")
@@ -1,140 +1,554 @@
-from typing import List, Optional, Dict
+import asyncio
+import base64
+import json
+from typing import AsyncIterator, List, Optional, Dict, Tuple, Union
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from ..config import settings
 from ..database import db
-from ..models.chat import ChatMessage, ChatSummary, PaginatedResponse
-from .gemini_service import gemini_service
+from ..models.chat import BulkInsertError, BulkInsertResult, ChatMessage, ChatSummary, MessageRow, PaginatedResponse, SearchResult
+from .cache_backend import get_cache_backend
+from .llm_scheduler import Priority
+from .message_cache import MessageCache, SharedMessageCache, create_message_cache
+from .purge_service import purge_service
+from .search_index import search_score, search_terms
+from .stats_service import stats_service
+from .gemini_service import gemini_service, SUMMARY_PROMPT, INCREMENTAL_SUMMARY_PROMPT, ANALYSIS_PROMPT
+
+# Message reads leave out the search terms, which only the queries use
+MESSAGE_PROJECTION = {'terms': 0}
 
 class ChatService:
-    # Cache for storing recent messages
-    _message_cache = {}
-    _cache_size = 100
+    # Cache of recent messages per conversation, created on first use
+    _message_cache: Optional[Union[MessageCache, SharedMessageCache]] = None
+
+    @staticmethod
+    def _messages() -> Union[MessageCache, SharedMessageCache]:
+        if ChatService._message_cache is None:
+            ChatService._message_cache = create_message_cache()
+        return ChatService._message_cache
 
     @staticmethod
     async def create_message(message: ChatMessage) -> ChatMessage:
+        await ChatService._insert_message(message)
+
+        # Generate bot response if the message is from a user
+        if message.user_id != 'bot':
+            prompt = await ChatService._bot_prompt(message.conversation_id)
+            
+            # Generate response using Gemini
+            response = await gemini_service.generate(prompt, priority=Priority.INTERACTIVE)
+            return await ChatService._save_bot_reply(message.conversation_id, response)
+        
+        return message
+
+    @staticmethod
+    async def stream_reply(message: ChatMessage) -> AsyncIterator[Dict]:
+        await ChatService._insert_message(message)
+        if message.user_id == 'bot':
+            yield {'event': 'message', 'data': message.model_dump(mode='json', by_alias=True)}
+            return
+        
+        prompt = await ChatService._bot_prompt(message.conversation_id)
+        
+        # Forward tokens as Gemini produces them, then persist the full reply
+        parts = []
+        async for text in gemini_service.stream(prompt):
+            parts.append(text)
+            yield {'event': 'token', 'data': {'text': text}}
+        
+        bot_message = await ChatService._save_bot_reply(message.conversation_id, ''.join(parts))
+        yield {'event': 'message', 'data': bot_message.model_dump(mode='json', by_alias=True)}
+
+    @staticmethod
+    async def bulk_create_messages(records: AsyncIterator[Union[str, bytes, Dict]]) -> BulkInsertResult:
+        received = 0
+        inserted = 0
+        errors = []
+        chunk = []
+        conversation_ids = set()
+        
+        # Validate and write in chunks; imported messages never trigger bot replies
+        async for record in records:
+            index = received
+            received += 1
+            try:
+                if isinstance(record, (str, bytes)):
+                    message = ChatMessage.model_validate_json(record)
+                else:
+                    message = ChatMessage.model_validate(record)
+            except Exception as e:
+                errors.append(BulkInsertError(index=index, error=str(e)))
+                continue
+            
+            message_dict = message.model_dump(by_alias=True, exclude_none=True)
+            message_dict.pop('_id', None)
+            message_dict['terms'] = search_terms(message.message)
+            chunk.append((index, message_dict))
+            conversation_ids.add(message.conversation_id)
+            
+            if len(chunk) >= settings.bulk_chunk_size:
+                inserted += await ChatService._insert_chunk(chunk, errors)
+                chunk = []
+        
+        if chunk:
+            inserted += await ChatService._insert_chunk(chunk, errors)
+        
+        for conversation_id in conversation_ids:
+            await ChatService._messages().invalidate(conversation_id)
+            gemini_service.cache.invalidate(conversation_id)
+        
+        errors.sort(key=lambda error: error.index)
+        return BulkInsertResult(received=received, inserted=inserted, errors=errors)
+
+    @staticmethod
+    async def _insert_chunk(chunk: List[Tuple[int, Dict]], errors: List[BulkInsertError]) -> int:
+        db_instance = await db.get_db()
+        try:
+            # Unordered so one bad record does not stop the rest of the chunk
+            result = await db_instance.messages.insert_many([doc for _, doc in chunk], ordered=False)
+            await stats_service.record_messages([doc for _, doc in chunk])
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            failed = set()
+            for error in e.details.get('writeErrors', []):
+                failed.add(error['index'])
+                errors.append(BulkInsertError(index=chunk[error['index']][0], error=error['errmsg']))
+            await stats_service.record_messages([doc for i, (_, doc) in enumerate(chunk) if i not in failed])
+            return e.details.get('nInserted', 0)
+
+    @staticmethod
+    async def _insert_message(message: ChatMessage):
         db_instance = await db.get_db()
         message_dict = message.model_dump(by_alias=True, exclude_none=True)
         if '_id' in message_dict:
             del message_dict['_id']
+        message_dict['terms'] = search_terms(message.message)
         
-        # Add to cache before DB operation
-        cache_key = f"{message.conversation_id}_{datetime.now().timestamp()}"
-        ChatService._message_cache[cache_key] = message_dict
-        
-        # Maintain cache size
-        if len(ChatService._message_cache) > ChatService._cache_size:
-            oldest_key = min(ChatService._message_cache.keys())
-            del ChatService._message_cache[oldest_key]
-        
-        # Batch insert to improve performance
         result = await db_instance.messages.insert_one(message_dict)
         message.id = str(result.inserted_id)
+        await stats_service.record_messages([message_dict])
+        # The cached copy has no use for the terms
+        del message_dict['terms']
+        
+        # Write through so the next turn reads the conversation from memory
+        await ChatService._messages().append(message.conversation_id, message_dict)
+        gemini_service.cache.invalidate(message.conversation_id)
 
-        # Generate bot response if the message is from a user
-        if message.user_id != 'bot':
-            # Get conversation history
-            conversation = await ChatService.get_message(message.conversation_id)
-            conversation_text = '\n'.join([f"{msg.user_id}: {msg.message}" for msg in conversation])
-            
-            # Generate response using Gemini
-            prompt = f"Please respond to this conversation as a helpful AI assistant:\n\n{conversation_text}"
-            response = await gemini_service.model.generate_content_async(prompt)
-            
-            # Create and save bot response
-            bot_message = ChatMessage(
-                conversation_id=message.conversation_id,
-                user_id='bot',
-                message=response.text,
-                timestamp=datetime.now().isoformat(),
-                metadata={}
+    @staticmethod
+    async def _bot_prompt(conversation_id: str) -> str:
+        # Get the recent conversation history within the context budget
+        conversation_text = await ChatService.build_context(conversation_id)
+        return f"Please respond to this conversation as a helpful AI assistant:\n\n{conversation_text}"
+
+    @staticmethod
+    async def _save_bot_reply(conversation_id: str, text: str) -> ChatMessage:
+        bot_message = ChatMessage(
+            conversation_id=conversation_id,
+            user_id='bot',
+            message=text,
+            metadata={}
+        )
+        await ChatService._insert_message(bot_message)
+        return bot_message
+
+    @staticmethod
+    def message_cache_stats() -> Dict:
+        return ChatService._messages().stats()
+
+    @staticmethod
+    async def build_context(
+        conversation_id: str,
+        max_messages: Optional[int] = None,
+        max_chars: Optional[int] = None
+    ) -> str:
+        db_instance = await db.get_db()
+        max_messages = max_messages or settings.context_max_messages
+        max_chars = max_chars or settings.context_max_chars
+        
+        docs = await ChatService._messages().get_recent(conversation_id, max_messages)
+        if docs is None:
+            generation = await ChatService._messages().generation(conversation_id)
+            # Read only the newest messages, newest first
+            query = ChatService._build_message_query(
+                conversation_id,
+                deleted_through=await purge_service.deleted_through(conversation_id)
+            )
+            cursor = db_instance.messages.find(query, MESSAGE_PROJECTION).sort('_id', -1).limit(max_messages)
+            docs = await cursor.to_list(max_messages)
+            docs.reverse()
+            await ChatService._messages().put(
+                conversation_id,
+                docs,
+                complete=len(docs) < max_messages,
+                generation=generation
             )
-            bot_dict = bot_message.model_dump(by_alias=True, exclude_none=True)
-            bot_result = await db_instance.messages.insert_one(bot_dict)
-            bot_message.id = str(bot_result.inserted_id)
-            return bot_message
         
-        return message
+        lines = []
+        used = 0
+        truncated = len(docs) == max_messages
+        for msg in reversed(docs):
+            line = f"{msg['user_id']}: {msg['message']}"
+            if lines and used + len(line) + 1 > max_chars:
+                truncated = True
+                break
+            lines.append(line)
+            used += len(line) + 1
+        lines.reverse()
+        
+        # Older history is represented by the stored rolling summary
+        if truncated:
+            previous = await ChatService.get_latest_summary(conversation_id)
+            if previous:
+                lines.insert(0, f"Summary of earlier conversation: {previous['summary']}\n")
+        
+        return '\n'.join(lines)
 
     @staticmethod
-    async def get_message(
+    def _build_message_query(
         conversation_id: str,
         search_query: Optional[str] = None,
         start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
-    ) -> List[ChatMessage]:
-        db_instance = await db.get_db()
+        end_date: Optional[datetime] = None,
+        after_id: Optional[str] = None,
+        deleted_through: Optional[ObjectId] = None
+    ) -> Dict:
         query = {'conversation_id': conversation_id}
         
-        # Add text search if provided
+        # Only return messages written after the given watermark
+        lower_bound = None
+        if after_id:
+            if not ObjectId.is_valid(after_id):
+                raise ValueError("Invalid message cursor")
+            lower_bound = ObjectId(after_id)
+        
+        # Messages of a deleted conversation stay hidden until they are purged
+        if deleted_through and (lower_bound is None or deleted_through > lower_bound):
+            lower_bound = deleted_through
+        if lower_bound:
+            query['_id'] = {'$gt': lower_bound}
+        
+        # Messages containing any of the words, served by the (conversation_id, terms) index
         if search_query:
-            query['message'] = {'$regex': search_query, '$options': 'i'}
+            query['terms'] = {'$in': search_terms(search_query)}
         
         # Add date range filters if provided
         if start_date or end_date:
             date_query = {}
             if start_date:
-                date_query['$gte'] = start_date.isoformat()
+                date_query['$gte'] = start_date
             if end_date:
-                date_query['$lte'] = end_date.isoformat()
+                date_query['$lte'] = end_date
             if date_query:
                 query['timestamp'] = date_query
         
-        cursor = db_instance.messages.find(query).sort('timestamp', 1)
-        messages = [ChatMessage(**msg) async for msg in cursor]
-        return messages
+        return query
 
     @staticmethod
-    async def get_user_messages(user_id: str, page: int = 1, limit: int = 10) -> PaginatedResponse:
+    async def get_message(
+        conversation_id: str,
+        search_query: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        after_id: Optional[str] = None
+    ) -> List[ChatMessage]:
+        unfiltered = not (search_query or start_date or end_date or after_id)
+        if unfiltered:
+            cached = await ChatService._messages().get_all(conversation_id)
+            if cached is not None:
+                return [ChatMessage(**msg) for msg in cached]
+        
+        # Taken before the read so a message inserted meanwhile is not cached away
+        generation = await ChatService._messages().generation(conversation_id) if unfiltered else None
         db_instance = await db.get_db()
-        skip = (page - 1) * limit
-        
-        # Use aggregation for efficient pagination
-        pipeline = [
-            {'$match': {'user_id': user_id}},
-            {'$sort': {'timestamp': -1}},
-            {
-                '$facet': {
-                    'total': [{'$count': 'count'}],
-                    'data': [{'$skip': skip}, {'$limit': limit}]
-                }
-            }
-        ]
-        
-        result = await db_instance.messages.aggregate(pipeline).to_list(1)
-        result = result[0]
-        
-        total = result['total'][0]['count'] if result['total'] else 0
-        messages = [ChatMessage(**msg) for msg in result['data']]
+        query = ChatService._build_message_query(
+            conversation_id,
+            search_query,
+            start_date,
+            end_date,
+            after_id,
+            await purge_service.deleted_through(conversation_id)
+        )
+        
+        # Incremental reads come in insertion order so the last row is the next `since` cursor
+        cursor = db_instance.messages.find(query, MESSAGE_PROJECTION).sort('_id' if after_id else 'timestamp', 1)
+        docs = await cursor.to_list(None)
+        if unfiltered and docs:
+            await ChatService._messages().put(conversation_id, docs, complete=True, generation=generation)
+        return [ChatMessage(**msg) for msg in docs]
+
+    @staticmethod
+    async def get_rows(conversation_id: str, after_id: Optional[str] = None) -> List[MessageRow]:
+        # Prompt building needs neither validation nor metadata
+        if not after_id:
+            cached = await ChatService._messages().get_all(conversation_id)
+            if cached is not None:
+                return [MessageRow.from_doc(msg) for msg in cached]
+        
+        db_instance = await db.get_db()
+        query = ChatService._build_message_query(
+            conversation_id,
+            after_id=after_id,
+            deleted_through=await purge_service.deleted_through(conversation_id)
+        )
+        cursor = db_instance.messages.find(query, MessageRow.PROJECTION).sort('_id', 1)
+        return [MessageRow.from_doc(msg) async for msg in cursor]
+
+    @staticmethod
+    async def conversation_etag(conversation_id: str) -> str:
+        # Messages are only appended or deleted with the conversation, so the newest id identifies the state;
+        # the cache is written through and invalidated on delete, so its tail holds that id when warm
+        cached = await ChatService._messages().get_recent(conversation_id, 1, record_stats=False)
+        if cached is not None:
+            last_message = cached[-1]['_id'] if cached else None
+        else:
+            last_message = await ChatService.last_message_id(conversation_id)
+        return f'W/"{last_message or "empty"}"'
+
+    @staticmethod
+    async def last_message_id(conversation_id: str) -> Optional[ObjectId]:
+        db_instance = await db.get_db()
+        query = ChatService._build_message_query(
+            conversation_id,
+            deleted_through=await purge_service.deleted_through(conversation_id)
+        )
+        last_message = await db_instance.messages.find_one(query, {'_id': 1}, sort=[('_id', -1)])
+        return last_message['_id'] if last_message else None
+
+    @staticmethod
+    async def stream_messages(
+        conversation_id: str,
+        search_query: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> AsyncIterator[bytes]:
+        db_instance = await db.get_db()
+        query = ChatService._build_message_query(
+            conversation_id,
+            search_query,
+            start_date,
+            end_date,
+            deleted_through=await purge_service.deleted_through(conversation_id)
+        )
+        
+        # Rows are encoded straight from the cursor without building models or a list
+        cursor = db_instance.messages.find(
+            query,
+            {'conversation_id': 1, 'user_id': 1, 'message': 1, 'timestamp': 1, 'metadata': 1}
+        ).sort('timestamp', 1).batch_size(settings.stream_batch_size)
+        
+        chunk = []
+        async for msg in cursor:
+            msg['_id'] = str(msg['_id'])
+            chunk.append(json.dumps(msg, default=ChatService._json_default))
+            if len(chunk) >= settings.stream_chunk_rows:
+                yield ('\n'.join(chunk) + '\n').encode()
+                chunk = []
+        if chunk:
+            yield ('\n'.join(chunk) + '\n').encode()
+
+    @staticmethod
+    def _json_default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    async def search_user_messages(user_id: str, search_query: str, limit: int = 20) -> List[SearchResult]:
+        db_instance = await db.get_db()
+        terms = search_terms(search_query)
+        
+        # Only the user's matching messages are read, through the (user_id, terms) index;
+        # they are ranked on their terms and the top ones fetched in full
+        query = {'user_id': user_id, 'terms': {'$in': terms}}
+        pending = await purge_service.pending_filters(user_id)
+        if pending:
+            query['$nor'] = pending
+        matches = await db_instance.messages.find(query, {'terms': 1}).to_list(None)
+        ranked = sorted(
+            ((search_score(terms, match['terms']), match['_id']) for match in matches),
+            reverse=True
+        )[:limit]
+        
+        scores = {message_id: score for score, message_id in ranked}
+        docs = await db_instance.messages.find({'_id': {'$in': list(scores)}}, MESSAGE_PROJECTION).to_list(None)
+        docs.sort(key=lambda doc: (scores[doc['_id']], doc['_id']), reverse=True)
+        return [SearchResult(score=scores[doc['_id']], **doc) for doc in docs]
+
+    @staticmethod
+    async def get_user_messages(
+        user_id: str,
+        page: int = 1,
+        limit: int = 10,
+        after: Optional[str] = None,
+        include_total: bool = False
+    ) -> PaginatedResponse:
+        db_instance = await db.get_db()
+        query = {'user_id': user_id}
+        
+        # Skip deleted conversations that are still being purged
+        pending = await purge_service.pending_filters(user_id)
+        if pending:
+            query['$nor'] = pending
+        
+        if after:
+            # Keyset pagination: continue strictly after the (timestamp, _id) of the cursor
+            timestamp, last_id = ChatService._decode_cursor(after)
+            query['$or'] = [
+                {'timestamp': {'$lt': timestamp}},
+                {'timestamp': timestamp, '_id': {'$lt': last_id}}
+            ]
+            # String timestamps sort below BSON dates and are not matched by a date comparison
+            if isinstance(timestamp, datetime):
+                query['$or'].append({'timestamp': {'$type': 'string'}})
+            skip = 0
+        else:
+            skip = (page - 1) * limit
+        
+        # Served by the (user_id, timestamp, _id) index
+        cursor = db_instance.messages.find(query, MESSAGE_PROJECTION).sort([('timestamp', -1), ('_id', -1)]).skip(skip).limit(limit)
+        docs = await cursor.to_list(limit)
+        messages = [ChatMessage(**msg) for msg in docs]
+        
+        next_cursor = None
+        if len(docs) == limit:
+            next_cursor = ChatService._encode_cursor(docs[-1]['timestamp'], docs[-1]['_id'])
+        
+        total = None
+        if not after or include_total:
+            total = await ChatService._count_user_messages(user_id)
         
         return PaginatedResponse(
             total=total,
-            page=page,
+            page=None if after else page,
             limit=limit,
-            data=messages
+            data=messages,
+            next_cursor=next_cursor
         )
 
+    @staticmethod
+    async def _count_user_messages(user_id: str) -> int:
+        # Read from the user rollup; users without one predate it or have no messages
+        stats = await stats_service.get_user_stats(user_id)
+        if stats:
+            return stats.message_count
+        
+        db_instance = await db.get_db()
+        return await db_instance.messages.count_documents({'user_id': user_id})
+
+    @staticmethod
+    def _encode_cursor(timestamp: Union[datetime, str], message_id: ObjectId) -> str:
+        if isinstance(timestamp, datetime):
+            value = {'t': timestamp.isoformat(), 'k': 'd', 'i': str(message_id)}
+        else:
+            value = {'t': timestamp, 'k': 's', 'i': str(message_id)}
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[Union[datetime, str], ObjectId]:
+        try:
+            value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            timestamp = datetime.fromisoformat(value['t']) if value['k'] == 'd' else value['t']
+            return timestamp, ObjectId(value['i'])
+        except Exception:
+            raise ValueError("Invalid pagination cursor")
+
     @staticmethod
     async def delete_message(conversation_id: str) -> bool:
+        last_message = await ChatService.last_message_id(conversation_id)
+        if not last_message:
+            return False
+        
+        # The tombstone lists the participants, so per-user queries only check their own deletes
+        participants = await stats_service.drop_conversation(conversation_id)
+        if participants is None:
+            db_instance = await db.get_db()
+            participants = await db_instance.messages.distinct('user_id', {'conversation_id': conversation_id})
+        
+        # Hidden immediately; messages and summaries are purged in the background
+        await purge_service.schedule(conversation_id, last_message, participants)
+        await ChatService._messages().invalidate(conversation_id)
+        gemini_service.cache.invalidate(conversation_id)
+        return True
+
+    @staticmethod
+    async def get_latest_summary(conversation_id: str) -> Optional[Dict]:
         db_instance = await db.get_db()
-        result = await db_instance.messages.delete_many({'conversation_id': conversation_id})
-        await db_instance.summaries.delete_many({'conversation_id': conversation_id})
-        return result.deleted_count > 0
+        query = {'conversation_id': conversation_id, 'last_message_id': {'$ne': None}}
+        
+        # Summaries of deleted messages are hidden until the purge removes them; ids compare as hex strings
+        deleted_through = await purge_service.deleted_through(conversation_id)
+        if deleted_through:
+            query['last_message_id'] = {'$gt': str(deleted_through)}
+        return await db_instance.summaries.find_one(query, sort=[('created_at', -1)])
 
     @staticmethod
     async def summarize_conversation(
         conversation_id: str,
         include_sentiment: bool = False,
-        include_keywords: bool = False
+        include_keywords: bool = False,
+        incremental: bool = False
+    ) -> ChatSummary:
+        # One worker cluster-wide summarizes a conversation at a time; the others then hit the caches
+        async with get_cache_backend().lock(f"lock:summarize:{conversation_id}", settings.summarize_lock_ttl):
+            return await ChatService._summarize_conversation(
+                conversation_id,
+                include_sentiment,
+                include_keywords,
+                incremental
+            )
+
+    @staticmethod
+    async def _summarize_conversation(
+        conversation_id: str,
+        include_sentiment: bool,
+        include_keywords: bool,
+        incremental: bool
     ) -> ChatSummary:
         db_instance = await db.get_db()
         
-        # Get messages for the conversation
-        messages = await ChatService.get_message(conversation_id)
-        if not messages:
-            raise ValueError(f"No messages found for conversation {conversation_id}")
+        analyze = include_sentiment or include_keywords
+        sentiment, keywords = None, []
         
-        # Generate summary
-        summary = await gemini_service.generate_summary(messages)
+        # In incremental mode only the messages after the last watermark are sent
+        previous = await ChatService.get_latest_summary(conversation_id) if incremental else None
+        
+        if previous:
+            messages = await ChatService.get_rows(conversation_id, after_id=previous['last_message_id'])
+            if not messages and (previous.get('sentiment') or not include_sentiment) and (previous.get('keywords') or not include_keywords):
+                return ChatSummary(**previous)
+            
+            # The prior summary stands in for the older history during analysis
+            analysis_messages = [MessageRow(None, conversation_id, 'summary', previous['summary'])] + messages
+            
+            if messages:
+                cache_keys = {'summary': gemini_service.cache_key(INCREMENTAL_SUMMARY_PROMPT, messages, previous['summary'])}
+                if analyze:
+                    summary, (sentiment, keywords) = await asyncio.gather(
+                        gemini_service.generate_incremental_summary(previous['summary'], messages),
+                        gemini_service.analyze_sentiment_and_keywords(analysis_messages)
+                    )
+                else:
+                    summary = await gemini_service.generate_incremental_summary(previous['summary'], messages)
+            else:
+                summary = previous['summary']
+                cache_keys = dict(previous.get('cache_keys', {}))
+                cache_keys.pop('analysis', None)
+                sentiment, keywords = await gemini_service.analyze_sentiment_and_keywords(analysis_messages)
+        else:
+            # Get messages for the conversation
+            messages = await ChatService.get_rows(conversation_id)
+            if not messages:
+                raise ValueError(f"No messages found for conversation {conversation_id}")
+            analysis_messages = messages
+            cache_keys = {'summary': gemini_service.cache_key(SUMMARY_PROMPT, messages)}
+            
+            # Summary, sentiment and keywords come from a single model call when possible
+            if analyze:
+                summary, sentiment, keywords = await gemini_service.analyze_conversation(messages)
+            else:
+                summary = await gemini_service.generate_summary(messages)
         
         # Create summary object
         chat_summary = ChatSummary(
@@ -143,18 +557,41 @@ class ChatService:
             summary=summary
         )
         
+        # Record the watermark for the next incremental run
+        if messages:
+            last_message = max(messages, key=lambda msg: ObjectId(msg.id))
+            chat_summary.last_message_id = last_message.id
+            chat_summary.last_message_timestamp = last_message.timestamp
+        else:
+            chat_summary.last_message_id = previous['last_message_id']
+            chat_summary.last_message_timestamp = previous.get('last_message_timestamp')
+        
         # Add sentiment and keywords if requested
-        if include_sentiment or include_keywords:
-            sentiment, keywords = await gemini_service.analyze_sentiment_and_keywords(messages)
-            if include_sentiment:
-                chat_summary.sentiment = sentiment
-            if include_keywords:
-                chat_summary.keywords = keywords
+        if include_sentiment:
+            chat_summary.sentiment = sentiment
+        if include_keywords:
+            chat_summary.keywords = keywords
+        
+        # Only a complete analysis can be served from this document later
+        if include_sentiment and include_keywords:
+            cache_keys['analysis'] = gemini_service.cache_key(ANALYSIS_PROMPT, analysis_messages)
+        
+        # Reuse an identical stored summary instead of inserting a duplicate
+        existing = await db_instance.summaries.find_one({
+            'conversation_id': conversation_id,
+            'cache_keys': cache_keys,
+            'sentiment': chat_summary.sentiment,
+            'keywords': chat_summary.keywords
+        })
+        if existing:
+            return ChatSummary(**existing)
         
         # Store summary in database
         summary_dict = chat_summary.model_dump(by_alias=True, exclude_none=True)
+        summary_dict['cache_keys'] = cache_keys
         result = await db_instance.summaries.insert_one(summary_dict)
         chat_summary.id = str(result.inserted_id)
+        await stats_service.record_summary(chat_summary)
         
         return chat_summary
 
@@ -1,44 +1,384 @@
-import google.generativeai as genai
-from typing import List, Tuple
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime
+from functools import cached_property
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from ..config import settings
-from ..models.chat import ChatMessage
+from ..database import db
+from ..metrics import LLM_LATENCY, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, span
+from ..models.chat import ConversationAnalysis, MessageRow, SentimentAnalysis
+from .cache_backend import CacheBackend, get_cache_backend
+from .llm_provider import LLMProvider, get_llm_provider
+from .llm_scheduler import LLMScheduler, ModelResponseError, Priority
+from .result_cache import ResultCache
+
+SUMMARY_PROMPT = "Please provide a concise summary of the following conversation:\n\n{conversation}"
+
+INCREMENTAL_SUMMARY_PROMPT = (
+    "Here is a summary of a conversation so far:\n\n"
+    "{previous_summary}\n\n"
+    "Update it into a single concise summary that also covers these new messages:\n\n"
+    "{conversation}"
+)
+
+CHUNK_SUMMARY_PROMPT = (
+    "Summarize this part of a longer conversation. "
+    "Keep names, decisions and open questions:\n\n{conversation}"
+)
+
+REDUCE_SUMMARY_PROMPT = (
+    "Combine these summaries of consecutive parts of one conversation "
+    "into a single concise summary:\n\n{summaries}"
+)
+
+# Rough token estimate used to size chunks
+CHARS_PER_TOKEN = 4
+
+ANALYSIS_PROMPT = (
+    "Analyze the following conversation and provide:\n"
+    "1. Overall sentiment (positive, negative, or neutral)\n"
+    "2. Key topics or keywords\n\n"
+    "{conversation}"
+)
+
+COMBINED_ANALYSIS_PROMPT = (
+    "Analyze the following conversation and provide:\n"
+    "1. A concise summary\n"
+    "2. Overall sentiment (positive, negative, or neutral)\n"
+    "3. Key topics or keywords\n\n"
+    "{conversation}"
+)
+
+SENTIMENT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'sentiment': {'type': 'string', 'format': 'enum', 'enum': ['positive', 'negative', 'neutral']},
+        'keywords': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['sentiment', 'keywords']
+}
+
+COMBINED_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string'},
+        **SENTIMENT_SCHEMA['properties']
+    },
+    'required': ['summary', 'sentiment', 'keywords']
+}
 
 class GeminiService:
-    def __init__(self):
-        genai.configure(api_key=settings.gemini_api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-
-    async def generate_summary(self, messages: List[ChatMessage]) -> str:
-        conversation = '\n'.join([f"{msg.user_id}: {msg.message}" for msg in messages])
-        prompt = f"Please provide a concise summary of the following conversation:\n\n{conversation}"
-        
-        response = await self.model.generate_content_async(prompt)
-        return response.text
-
-    async def analyze_sentiment_and_keywords(self, messages: List[ChatMessage]) -> Tuple[str, List[str]]:
-        conversation = '\n'.join([f"{msg.user_id}: {msg.message}" for msg in messages])
-        prompt = (
-            "Analyze the following conversation and provide:\n"
-            "1. Overall sentiment (positive, negative, or neutral)\n"
-            "2. Key topics or keywords (comma-separated)\n\n"
-            f"{conversation}"
+    # Dependencies are created on first use, so importing the module stays cheap
+    @cached_property
+    def provider(self) -> LLMProvider:
+        return get_llm_provider()
+
+    @cached_property
+    def model_name(self) -> str:
+        return self.provider.model_name
+
+    @cached_property
+    def cache(self) -> ResultCache:
+        return ResultCache(settings.result_cache_size, settings.result_cache_ttl)
+
+    @cached_property
+    def shared_cache(self) -> CacheBackend:
+        return get_cache_backend()
+
+    @cached_property
+    def scheduler(self) -> LLMScheduler:
+        return LLMScheduler(
+            rate_per_second=settings.llm_rate_per_second,
+            burst=settings.llm_burst,
+            max_in_flight=settings.llm_max_in_flight,
+            timeout=settings.llm_timeout,
+            max_attempts=settings.llm_max_attempts
+        )
+
+    async def generate(
+        self,
+        prompt: str,
+        priority: Priority = Priority.BATCH,
+        response_schema: Optional[Dict] = None
+    ) -> str:
+        operation = 'structured' if response_schema else 'generate'
+        LLM_PROMPT_CHARS.observe(len(prompt), operation=operation)
+        start = time.perf_counter()
+        outcome = 'error'
+        
+        # Every model call is rate limited, capped and retried by the scheduler
+        with span('llm.generate', operation=operation, priority=priority.name, prompt_chars=len(prompt)):
+            try:
+                response = await self.scheduler.run(
+                    lambda: self.provider.generate(prompt, response_schema),
+                    priority=priority
+                )
+                outcome = 'success'
+            finally:
+                LLM_LATENCY.observe(time.perf_counter() - start, operation=operation, outcome=outcome)
+        
+        LLM_RESPONSE_CHARS.observe(len(response), operation=operation)
+        return response
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        LLM_PROMPT_CHARS.observe(len(prompt), operation='stream')
+        start = time.perf_counter()
+        outcome = 'error'
+        size = 0
+        
+        # Streams hold an in-flight slot until the last chunk; they are not retried
+        try:
+            async with self.scheduler.slot(Priority.INTERACTIVE):
+                async for text in self.provider.stream(prompt):
+                    size += len(text)
+                    yield text
+            outcome = 'success'
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - start, operation='stream', outcome=outcome)
+            LLM_RESPONSE_CHARS.observe(size, operation='stream')
+
+    @staticmethod
+    def format_conversation(messages: List[MessageRow]) -> str:
+        return '\n'.join([f"{msg.user_id}: {msg.message}" for msg in messages])
+
+    def cache_key(self, template: str, messages: List[MessageRow], context: str = '') -> str:
+        # Content-addressed: any change to prompt, model or messages yields a new key
+        digest = hashlib.sha256()
+        digest.update(template.encode())
+        digest.update(self.model_name.encode())
+        digest.update(context.encode())
+        for msg in messages:
+            digest.update(f"\0{msg.id}\0{msg.user_id}\0{msg.message}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return len(text) // CHARS_PER_TOKEN + 1
+
+    def chunk_messages(self, messages: List[MessageRow]) -> List[List[MessageRow]]:
+        # Greedy from the start, so appending messages only changes the last chunk
+        chunks, current, used = [], [], 0
+        for msg in messages:
+            tokens = self.estimate_tokens(f"{msg.user_id}: {msg.message}")
+            if current and used + tokens > settings.summary_chunk_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(msg)
+            used += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def generate_summary(self, messages: List[MessageRow]) -> str:
+        key = self.cache_key(SUMMARY_PROMPT, messages)
+        cached = await self._get_cached('summary', key)
+        if cached is not None:
+            return cached
+        
+        conversation = self.format_conversation(messages)
+        if self.estimate_tokens(conversation) > settings.summary_chunk_tokens:
+            summary = await self.hierarchical_summary(messages)
+            await self._remember(key, summary, messages[0].conversation_id)
+            return summary
+        return await self._summarize(key, messages[0].conversation_id, conversation)
+
+    async def generate_incremental_summary(self, previous_summary: str, messages: List[MessageRow]) -> str:
+        key = self.cache_key(INCREMENTAL_SUMMARY_PROMPT, messages, previous_summary)
+        cached = await self._get_cached('summary', key)
+        if cached is not None:
+            return cached
+        
+        conversation = await self._within_budget(messages)
+        prompt = INCREMENTAL_SUMMARY_PROMPT.format(previous_summary=previous_summary, conversation=conversation)
+
+        response = await self.generate(prompt)
+        await self._remember(key, response, messages[0].conversation_id)
+        return response
+
+    async def analyze_sentiment_and_keywords(self, messages: List[MessageRow]) -> Tuple[str, List[str]]:
+        key = self.cache_key(ANALYSIS_PROMPT, messages)
+        cached = await self._get_cached('analysis', key)
+        if cached is not None:
+            return cached
+        return await self._analyze(key, messages[0].conversation_id, await self._within_budget(messages))
+
+    async def analyze_conversation(self, messages: List[MessageRow]) -> Tuple[str, str, List[str]]:
+        conversation_id = messages[0].conversation_id
+        summary_key = self.cache_key(SUMMARY_PROMPT, messages)
+        analysis_key = self.cache_key(ANALYSIS_PROMPT, messages)
+        
+        summary = await self._get_cached('summary', summary_key)
+        analysis = await self._get_cached('analysis', analysis_key)
+        if summary is not None and analysis is not None:
+            return (summary, *analysis)
+        
+        conversation = self.format_conversation(messages)
+        
+        # Too long for one prompt: map-reduce the summary, then analyze the summary
+        if self.estimate_tokens(conversation) > settings.summary_chunk_tokens:
+            if summary is None:
+                summary = await self.hierarchical_summary(messages)
+                await self._remember(summary_key, summary, conversation_id)
+            if analysis is None:
+                analysis = await self._analyze(analysis_key, conversation_id, summary)
+            return (summary, *analysis)
+        
+        # Ask for everything in one structured response when nothing is cached
+        if summary is None and analysis is None:
+            response = await self.generate(
+                COMBINED_ANALYSIS_PROMPT.format(conversation=conversation),
+                response_schema=COMBINED_SCHEMA
+            )
+            # Only a malformed response falls back; model errors were already retried by the scheduler
+            try:
+                result = ConversationAnalysis.model_validate_json(response)
+            except ValueError:
+                result = None
+            if result is not None:
+                await self._remember(summary_key, result.summary, conversation_id)
+                await self._remember(analysis_key, (result.sentiment, result.keywords), conversation_id)
+                return result.summary, result.sentiment, result.keywords
+        
+        # Fall back to the separate calls, run concurrently
+        async def cached(value):
+            return value
+        
+        summary, (sentiment, keywords) = await asyncio.gather(
+            cached(summary) if summary is not None else self._summarize(summary_key, conversation_id, conversation),
+            cached(analysis) if analysis is not None else self._analyze(analysis_key, conversation_id, conversation)
+        )
+        return summary, sentiment, keywords
+
+    async def hierarchical_summary(self, messages: List[MessageRow]) -> str:
+        conversation_id = messages[0].conversation_id
+        semaphore = asyncio.Semaphore(settings.summary_chunk_concurrency)
+        
+        async def summarize_chunk(chunk: List[MessageRow]) -> str:
+            async with semaphore:
+                return await self._chunk_summary(conversation_id, chunk)
+        
+        # Map: chunks are summarized concurrently; unchanged chunks come from the store
+        partials = await asyncio.gather(*[summarize_chunk(chunk) for chunk in self.chunk_messages(messages)])
+        return await self._reduce(conversation_id, list(partials), semaphore)
+
+    async def _chunk_summary(self, conversation_id: str, chunk: List[MessageRow]) -> str:
+        key = self.cache_key(CHUNK_SUMMARY_PROMPT, chunk)
+        cached = await self._get_cached('chunk', key)
+        if cached is not None:
+            return cached
+        
+        response = await self.generate(CHUNK_SUMMARY_PROMPT.format(conversation=self.format_conversation(chunk)))
+        await self._store_chunk(key, conversation_id, response)
+        await self._remember(key, response, conversation_id)
+        return response
+
+    async def _store_chunk(self, key: str, conversation_id: str, summary: str):
+        db_instance = await db.get_db()
+        await db_instance.summary_chunks.update_one(
+            {'_id': key},
+            {'$setOnInsert': {'conversation_id': conversation_id, 'summary': summary, 'created_at': datetime.utcnow()}},
+            upsert=True
         )
+
+    async def _reduce(self, conversation_id: str, summaries: List[str], semaphore: asyncio.Semaphore) -> str:
+        if len(summaries) == 1:
+            return summaries[0]
         
-        response = await self.model.generate_content_async(prompt)
-        result = response.text.split('\n')
+        # Reduce: group partial summaries within the budget, at least two per group so each level shrinks
+        groups, current, used = [], [], 0
+        for summary in summaries:
+            tokens = self.estimate_tokens(summary)
+            if len(current) >= 2 and used + tokens > settings.summary_chunk_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(summary)
+            used += tokens
+        groups.append(current)
         
-        sentiment = 'neutral'
-        keywords = []
+        async def reduce_group(group: List[str]) -> str:
+            if len(group) == 1:
+                return group[0]
+            digest = hashlib.sha256(f"{REDUCE_SUMMARY_PROMPT}\0{self.model_name}".encode())
+            for summary in group:
+                digest.update(f"\0{summary}".encode())
+            key = digest.hexdigest()
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            
+            async with semaphore:
+                response = await self.generate(REDUCE_SUMMARY_PROMPT.format(summaries='\n\n'.join(group)))
+            await self._remember(key, response, conversation_id)
+            return response
         
-        for line in result:
-            if 'sentiment' in line.lower():
-                if 'positive' in line.lower():
-                    sentiment = 'positive'
-                elif 'negative' in line.lower():
-                    sentiment = 'negative'
-            elif 'key' in line.lower() and ':' in line:
-                keywords = [k.strip() for k in line.split(':', 1)[1].split(',')]
+        reduced = await asyncio.gather(*[reduce_group(group) for group in groups])
+        return await self._reduce(conversation_id, list(reduced), semaphore)
+
+    async def _within_budget(self, messages: List[MessageRow]) -> str:
+        # Transcripts over the chunk budget are replaced by their map-reduce summary
+        conversation = self.format_conversation(messages)
+        if self.estimate_tokens(conversation) <= settings.summary_chunk_tokens:
+            return conversation
+        return await self.hierarchical_summary(messages)
+
+    async def _summarize(self, key: str, conversation_id: str, conversation: str) -> str:
+        response = await self.generate(SUMMARY_PROMPT.format(conversation=conversation))
+        await self._remember(key, response, conversation_id)
+        return response
+
+    async def _analyze(self, key: str, conversation_id: str, conversation: str) -> Tuple[str, List[str]]:
+        response = await self.generate(
+            ANALYSIS_PROMPT.format(conversation=conversation),
+            response_schema=SENTIMENT_SCHEMA
+        )
+        try:
+            result = SentimentAnalysis.model_validate_json(response)
+        except ValueError as e:
+            raise ModelResponseError("Model returned a malformed analysis") from e
+        await self._remember(key, (result.sentiment, result.keywords), conversation_id)
+        return result.sentiment, result.keywords
+
+    async def _get_cached(self, kind: str, key: str) -> Optional[Any]:
+        # First tier: in-process LRU
+        value = self.cache.get(key)
+        if value is not None:
+            self.cache.memory_hits += 1
+            return value
         
-        return sentiment, keywords
+        # Shared tier: results computed by any worker
+        if self.shared_cache.shared:
+            shared = await self.shared_cache.get(f"result:{key}")
+            if shared is not None:
+                entry = json.loads(shared)
+                value = tuple(entry['value']) if kind == 'analysis' else entry['value']
+                self.cache.shared_hits += 1
+                self.cache.set(key, value, entry['conversation_id'])
+                return value
+        
+        # Second tier: summaries stored with the same cache key, or stored chunk summaries
+        db_instance = await db.get_db()
+        if kind == 'chunk':
+            doc = await db_instance.summary_chunks.find_one({'_id': key})
+        else:
+            doc = await db_instance.summaries.find_one(
+                {f'cache_keys.{kind}': key},
+                {'conversation_id': 1, 'summary': 1, 'sentiment': 1, 'keywords': 1}
+            )
+        if doc is None:
+            self.cache.misses += 1
+            return None
+        
+        value = (doc['sentiment'], doc['keywords']) if kind == 'analysis' else doc['summary']
+        self.cache.persistent_hits += 1
+        self.cache.set(key, value, doc['conversation_id'])
+        return value
+
+    async def _remember(self, key: str, value: Any, conversation_id: str):
+        self.cache.set(key, value, conversation_id)
+        if self.shared_cache.shared:
+            entry = json.dumps({'conversation_id': conversation_id, 'value': value})
+            await self.shared_cache.set(f"result:{key}", entry, settings.shared_cache_ttl)
 
-gemini_service = GeminiService()
\ No newline at end of file
+gemini_service = GeminiService()
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from ..config import settings
+from ..database import db
+from ..models.chat import ChatSummarizeRequest, SummaryJob
+from .chat_service import chat_service
+
+logger = logging.getLogger(__name__)
+
+class JobService:
+    _queue: Optional[asyncio.Queue] = None
+    _workers: List[asyncio.Task] = []
+
+    @classmethod
+    async def start(cls, worker_count: Optional[int] = None):
+        cls._queue = asyncio.Queue()
+        
+        # Pick up jobs that were submitted but never processed, or whose worker died
+        db_instance = await db.get_db()
+        async for job in db_instance.summary_jobs.find(cls._claimable(datetime.utcnow()), {'_id': 1}):
+            cls._queue.put_nowait(job['_id'])
+        
+        worker_count = worker_count or settings.summary_workers
+        cls._workers = [asyncio.create_task(cls._worker()) for _ in range(worker_count)]
+
+    @classmethod
+    async def stop(cls):
+        for worker in cls._workers:
+            worker.cancel()
+        await asyncio.gather(*cls._workers, return_exceptions=True)
+        cls._workers = []
+        cls._queue = None
+
+    @classmethod
+    async def submit(cls, request: ChatSummarizeRequest) -> SummaryJob:
+        db_instance = await db.get_db()
+        last_message = await chat_service.last_message_id(request.conversation_id)
+        if not last_message:
+            raise ValueError(f"No messages found for conversation {request.conversation_id}")
+        
+        # Submits for the same unchanged conversation and options share one job
+        dedup_key = ':'.join([
+            request.conversation_id,
+            str(last_message),
+            str(int(request.include_sentiment)),
+            str(int(request.include_keywords)),
+            str(int(request.incremental))
+        ])
+        
+        now = datetime.utcnow()
+        job = SummaryJob(
+            conversation_id=request.conversation_id,
+            include_sentiment=request.include_sentiment,
+            include_keywords=request.include_keywords,
+            incremental=request.incremental,
+            created_at=now,
+            updated_at=now
+        )
+        job_dict = job.model_dump(by_alias=True, exclude_none=True)
+        job_dict['dedup_key'] = dedup_key
+        result = await db_instance.summary_jobs.update_one(
+            {'dedup_key': dedup_key},
+            {'$setOnInsert': job_dict},
+            upsert=True
+        )
+        if result.upserted_id:
+            cls._enqueue(result.upserted_id)
+            job.id = str(result.upserted_id)
+            return job
+        
+        existing = await db_instance.summary_jobs.find_one({'dedup_key': dedup_key})
+        
+        # A failed or abandoned job is retried when it is submitted again
+        if existing['status'] in ('failed', 'running'):
+            retried = await db_instance.summary_jobs.find_one_and_update(
+                {'_id': existing['_id'], '$or': [{'status': 'failed'}, cls._abandoned(now)]},
+                {'$set': {'status': 'pending', 'error': None, 'updated_at': now}},
+                return_document=ReturnDocument.AFTER
+            )
+            if retried:
+                cls._enqueue(retried['_id'])
+                existing = retried
+        
+        return SummaryJob(**existing)
+
+    @staticmethod
+    async def get_job(job_id: str) -> Optional[SummaryJob]:
+        if not ObjectId.is_valid(job_id):
+            return None
+        db_instance = await db.get_db()
+        job = await db_instance.summary_jobs.find_one({'_id': ObjectId(job_id)})
+        return SummaryJob(**job) if job else None
+
+    @staticmethod
+    def _abandoned(now: datetime) -> Dict:
+        # Jobs left running by a process that stopped renewing its lease
+        return {'status': 'running', 'claimed_until': {'$not': {'$gte': now}}}
+
+    @classmethod
+    def _claimable(cls, now: datetime) -> Dict:
+        return {'$or': [{'status': 'pending'}, cls._abandoned(now)]}
+
+    @classmethod
+    def _enqueue(cls, job_id: ObjectId):
+        # Without running workers the job stays pending until the next start
+        if cls._queue is not None:
+            cls._queue.put_nowait(job_id)
+
+    @classmethod
+    async def _worker(cls):
+        while True:
+            job_id = await cls._queue.get()
+            try:
+                await cls._run(job_id)
+            except Exception:
+                # A database error while claiming or saving a job must not stop the worker
+                logger.exception("Summary job %s could not be run", job_id)
+            finally:
+                cls._queue.task_done()
+
+    @classmethod
+    async def _run(cls, job_id: ObjectId):
+        db_instance = await db.get_db()
+        now = datetime.utcnow()
+        lease = timedelta(seconds=settings.summary_job_lease_seconds)
+        
+        # Claim the job so no other worker or process runs it
+        job = await db_instance.summary_jobs.find_one_and_update(
+            {'_id': job_id, **cls._claimable(now)},
+            {'$set': {'status': 'running', 'claimed_until': now + lease, 'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not job:
+            return
+        
+        async def renew():
+            while True:
+                await asyncio.sleep(lease.total_seconds() / 3)
+                await db_instance.summary_jobs.update_one(
+                    {'_id': job_id, 'status': 'running'},
+                    {'$set': {'claimed_until': datetime.utcnow() + lease}}
+                )
+        
+        renewal = asyncio.create_task(renew())
+        try:
+            summary = await chat_service.summarize_conversation(
+                job['conversation_id'],
+                job['include_sentiment'],
+                job['include_keywords'],
+                job['incremental']
+            )
+            update = {
+                'status': 'completed',
+                'result': summary.model_dump(by_alias=True, exclude_none=True)
+            }
+        except Exception as e:
+            update = {'status': 'failed', 'error': str(e)}
+        finally:
+            renewal.cancel()
+        
+        update['updated_at'] = datetime.utcnow()
+        await db_instance.summary_jobs.update_one({'_id': job_id}, {'$set': update})
+
+job_service = JobService()
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import json
+import random
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Optional
+from ..config import settings
+
+class LLMProvider(ABC):
+    model_name: str
+
+    @abstractmethod
+    async def generate(self, prompt: str, response_schema: Optional[Dict] = None) -> str:
+        ...
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        ...
+
+class GeminiProvider(LLMProvider):
+    def __init__(self, api_key: str, model_name: str = 'gemini-2.0-flash'):
+        # Imported here so the fake provider works without the Gemini SDK
+        import google.generativeai as genai
+        self._genai = genai
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict] = None) -> str:
+        kwargs = {}
+        if response_schema:
+            kwargs['generation_config'] = self._genai.GenerationConfig(
+                response_mime_type='application/json',
+                response_schema=response_schema
+            )
+        response = await self.model.generate_content_async(prompt, **kwargs)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+class FakeModelError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"Injected model error {code}")
+        self.code = code
+
+class FakeProvider(LLMProvider):
+    model_name = 'fake'
+
+    def __init__(
+        self,
+        latency_mean: float = 0.2,
+        latency_stddev: float = 0.05,
+        stream_chunks: int = 8,
+        error_rate: float = 0.0,
+        error_code: int = 429,
+        seed: Optional[int] = None
+    ):
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.stream_chunks = stream_chunks
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def _latency(self) -> float:
+        return max(0.0, self._random.gauss(self.latency_mean, self.latency_stddev))
+
+    def _maybe_fail(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise FakeModelError(self.error_code)
+
+    @staticmethod
+    def _text(prompt: str) -> str:
+        # Same prompt, same answer
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return f"Fake response {digest} to a {len(prompt)}-character prompt."
+
+    @staticmethod
+    def _fill_schema(schema: Dict, text: str):
+        if schema.get('type') == 'object':
+            return {name: FakeProvider._fill_schema(prop, text) for name, prop in schema.get('properties', {}).items()}
+        if schema.get('type') == 'array':
+            return [FakeProvider._fill_schema(schema.get('items', {}), text)]
+        if 'enum' in schema:
+            return schema['enum'][0]
+        return text
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict] = None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self._latency())
+        self._maybe_fail()
+        text = self._text(prompt)
+        if response_schema:
+            return json.dumps(self._fill_schema(response_schema, text))
+        return text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        self.calls += 1
+        self._maybe_fail()
+        words = self._text(prompt).split(' ')
+        size = max(1, -(-len(words) // self.stream_chunks))
+
+        # Spread the total latency across the chunks
+        delay = self._latency() / self.stream_chunks
+        for i in range(0, len(words), size):
+            await asyncio.sleep(delay)
+            yield ' '.join(words[i:i + size]) + (' ' if i + size < len(words) else '')
+
+@lru_cache()
+def get_llm_provider() -> LLMProvider:
+    if settings.llm_provider == 'gemini':
+        return GeminiProvider(settings.gemini_api_key, settings.gemini_model)
+    if settings.llm_provider == 'fake':
+        return FakeProvider(
+            latency_mean=settings.fake_llm_latency_mean,
+            latency_stddev=settings.fake_llm_latency_stddev,
+            stream_chunks=settings.fake_llm_stream_chunks,
+            error_rate=settings.fake_llm_error_rate,
+            error_code=settings.fake_llm_error_code,
+            seed=settings.fake_llm_seed
+        )
+    raise ValueError(f"Unknown LLM provider: {settings.llm_provider}")
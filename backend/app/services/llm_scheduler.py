@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+T = TypeVar('T')
+
+# HTTP status codes of model errors worth retrying
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+QUOTA_CODE = 429
+
+class Priority(IntEnum):
+    # Lower values are served first
+    INTERACTIVE = 0
+    BATCH = 1
+
+class ModelOverloadedError(Exception):
+    pass
+
+class ModelTimeoutError(Exception):
+    pass
+
+class ModelResponseError(Exception):
+    pass
+
+def error_code(exc: BaseException) -> Optional[int]:
+    # google.api_core errors expose the HTTP status as `code`; fakes can do the same
+    code = getattr(exc, 'code', None)
+    return code if isinstance(code, int) else None
+
+def is_retryable(exc: BaseException) -> bool:
+    return error_code(exc) in RETRYABLE_CODES
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class PrioritySemaphore:
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int):
+        # Free slots only exist while nobody is waiting, since release hands slots over directly
+        if self._value > 0:
+            self._value -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before cancellation
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        # Hand the slot to the highest-priority, oldest live waiter
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+class LLMScheduler:
+    def __init__(
+        self,
+        rate_per_second: float = 10.0,
+        burst: int = 20,
+        max_in_flight: int = 8,
+        timeout: float = 60.0,
+        max_attempts: int = 4
+    ):
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._semaphore = PrioritySemaphore(max_in_flight)
+        self.in_flight = 0
+        self.retries = 0
+        self.throttled = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.BATCH):
+        await self._semaphore.acquire(priority)
+        self.in_flight += 1
+        try:
+            await self._bucket.acquire()
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        priority: Priority = Priority.BATCH,
+        timeout: Optional[float] = None
+    ) -> T:
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        def past_deadline(retry_state) -> bool:
+            return time.monotonic() >= deadline
+
+        def backoff(retry_state) -> float:
+            # Jittered exponential backoff, never sleeping past the deadline
+            delay = wait_random_exponential(multiplier=0.5, max=10)(retry_state)
+            return max(0.0, min(delay, deadline - time.monotonic()))
+
+        def record_retry(retry_state):
+            self.retries += 1
+
+        async def attempt_call() -> T:
+            async with self.slot(priority):
+                return await call()
+
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(self.max_attempts) | past_deadline,
+                wait=backoff,
+                retry=retry_if_exception(is_retryable),
+                before_sleep=record_retry,
+                reraise=True
+            ):
+                with attempt:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        return await asyncio.wait_for(attempt_call(), remaining)
+                    except Exception as e:
+                        if error_code(e) == QUOTA_CODE:
+                            self.throttled += 1
+                        raise
+        except asyncio.TimeoutError:
+            raise ModelTimeoutError("Model call did not finish before its deadline")
+        except Exception as e:
+            if error_code(e) == QUOTA_CODE:
+                raise ModelOverloadedError("Model quota exhausted, try again later") from e
+            raise
+
+    def stats(self) -> Dict:
+        return {
+            'in_flight': self.in_flight,
+            'queued': self._semaphore.waiting,
+            'retries': self.retries,
+            'throttled': self.throttled
+        }
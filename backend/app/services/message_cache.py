@@ -0,0 +1,248 @@
+import json
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+from ..config import settings
+from .cache_backend import CacheBackend, get_cache_backend
+
+# Rough per-message overhead of the dict, ObjectId and datetime
+MESSAGE_OVERHEAD_BYTES = 256
+
+# Conversations whose write generation is remembered individually
+MAX_TRACKED_GENERATIONS = 100000
+
+class ConversationEntry:
+    __slots__ = ('messages', 'complete', 'size')
+
+    def __init__(self):
+        self.messages: Deque[Dict] = deque()
+        # True when the entry holds the whole conversation, not just its tail
+        self.complete = False
+        self.size = 0
+
+class MessageCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_messages_per_conversation: int = 200):
+        self.max_bytes = max_bytes
+        self.max_messages_per_conversation = max_messages_per_conversation
+        # conversation_id -> entry, least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        # conversation_id -> generation of its last write, oldest first; forgotten
+        # conversations report the floor, so a read that raced them is dropped
+        self._generations: OrderedDict = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def message_size(message: Dict) -> int:
+        size = len(message.get('message', '')) + len(message.get('user_id', '')) + MESSAGE_OVERHEAD_BYTES
+        # Metadata is free-form and can outweigh the text, so its serialised length stands in for it
+        metadata = message.get('metadata')
+        if metadata:
+            size += len(json.dumps(metadata, default=str))
+        return size
+
+    async def get_recent(self, conversation_id: str, count: int, record_stats: bool = True) -> Optional[List[Dict]]:
+        # Bookkeeping lookups pass record_stats=False so the hit rate reflects message reads only
+        entry = self._entries.get(conversation_id)
+        if entry is None or (len(entry.messages) < count and not entry.complete):
+            self.misses += record_stats
+            return None
+        self.hits += record_stats
+        self._entries.move_to_end(conversation_id)
+        messages = list(entry.messages)
+        return messages[-count:] if count else messages
+
+    async def get_all(self, conversation_id: str) -> Optional[List[Dict]]:
+        entry = self._entries.get(conversation_id)
+        if entry is None or not entry.complete:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(conversation_id)
+        return list(entry.messages)
+
+    async def generation(self, conversation_id: str) -> int:
+        # Taken before a database read and handed back to put
+        return self._generations.get(conversation_id, self._floor)
+
+    async def put(self, conversation_id: str, messages: List[Dict], complete: bool, generation: Optional[int] = None) -> bool:
+        # A write since the read started means the messages may already be stale
+        if generation is not None and generation != await self.generation(conversation_id):
+            return False
+        self._drop(conversation_id)
+        entry = ConversationEntry()
+        entry.complete = complete
+        self._entries[conversation_id] = entry
+        for message in messages:
+            self._append(entry, message)
+        self._evict()
+        return True
+
+    async def append(self, conversation_id: str, message: Dict):
+        self._bump(conversation_id)
+        # Write-through only for conversations already cached
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return
+        self._entries.move_to_end(conversation_id)
+        self._append(entry, message)
+        self._evict()
+
+    async def invalidate(self, conversation_id: str):
+        self._bump(conversation_id)
+        self._drop(conversation_id)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'conversations': len(self._entries),
+            'bytes': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def _bump(self, conversation_id: str):
+        self._clock += 1
+        self._generations[conversation_id] = self._clock
+        self._generations.move_to_end(conversation_id)
+        while len(self._generations) > MAX_TRACKED_GENERATIONS:
+            _, self._floor = self._generations.popitem(last=False)
+
+    def _drop(self, conversation_id: str):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _append(self, entry: ConversationEntry, message: Dict):
+        size = self.message_size(message)
+        entry.messages.append(message)
+        entry.size += size
+        self._size += size
+        
+        # Keep only the tail of long conversations
+        while len(entry.messages) > self.max_messages_per_conversation:
+            dropped = self.message_size(entry.messages.popleft())
+            entry.size -= dropped
+            self._size -= dropped
+            entry.complete = False
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _decode(item: str) -> Dict:
+    # Timestamps go through JSON as ISO strings; readers expect datetimes like the database returns
+    message = json.loads(item)
+    if isinstance(message.get('timestamp'), str):
+        message['timestamp'] = datetime.fromisoformat(message['timestamp'])
+    return message
+
+class SharedMessageCache:
+    # Same interface as MessageCache, stored in a backend shared by all workers
+    def __init__(self, backend: CacheBackend, max_messages_per_conversation: int = 200, ttl: int = 3600):
+        self.backend = backend
+        self.max_messages_per_conversation = max_messages_per_conversation
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _keys(conversation_id: str):
+        return f"messages:{conversation_id}", f"messages:{conversation_id}:state"
+
+    @staticmethod
+    def _generation_key(conversation_id: str) -> str:
+        return f"messages:{conversation_id}:generation"
+
+    async def _bump(self, conversation_id: str):
+        key = self._generation_key(conversation_id)
+        await self.backend.incr(key)
+        await self.backend.expire(key, self.ttl)
+
+    async def get_recent(self, conversation_id: str, count: int, record_stats: bool = True) -> Optional[List[Dict]]:
+        list_key, state_key = self._keys(conversation_id)
+        state = await self.backend.get(state_key)
+        if state is None:
+            self.misses += record_stats
+            return None
+        items = await self.backend.lrange(list_key, -count if count else 0, -1)
+        if len(items) < count and state != 'complete':
+            self.misses += record_stats
+            return None
+        self.hits += record_stats
+        return [_decode(item) for item in items]
+
+    async def get_all(self, conversation_id: str) -> Optional[List[Dict]]:
+        list_key, state_key = self._keys(conversation_id)
+        if await self.backend.get(state_key) != 'complete':
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [_decode(item) for item in await self.backend.lrange(list_key, 0, -1)]
+
+    async def generation(self, conversation_id: str) -> int:
+        return int(await self.backend.get(self._generation_key(conversation_id)) or 0)
+
+    async def put(self, conversation_id: str, messages: List[Dict], complete: bool, generation: Optional[int] = None) -> bool:
+        if generation is not None and generation != await self.generation(conversation_id):
+            return False
+        list_key, state_key = self._keys(conversation_id)
+        tail = messages[-self.max_messages_per_conversation:]
+        complete = complete and len(tail) == len(messages)
+        # One atomic replace, so concurrent fills cannot interleave their pushes
+        await self.backend.replace_list(
+            list_key,
+            [json.dumps(msg, default=_json_default) for msg in tail],
+            self.ttl,
+            state_key,
+            'complete' if complete else 'partial'
+        )
+
+        # Writers bump the generation before touching the list, so one that slipped in
+        # between the check and the fill is caught here
+        if generation is not None and generation != await self.generation(conversation_id):
+            await self.backend.delete(list_key, state_key)
+            return False
+        return True
+
+    async def append(self, conversation_id: str, message: Dict):
+        await self._bump(conversation_id)
+        # Write-through only for conversations already cached
+        list_key, state_key = self._keys(conversation_id)
+        if await self.backend.get(state_key) is None:
+            return
+        length = await self.backend.rpush(list_key, json.dumps(message, default=_json_default))
+        if length > self.max_messages_per_conversation:
+            await self.backend.ltrim(list_key, -self.max_messages_per_conversation, -1)
+            await self.backend.set(state_key, 'partial', self.ttl)
+        await self.backend.expire(list_key, self.ttl)
+
+    async def invalidate(self, conversation_id: str):
+        await self._bump(conversation_id)
+        await self.backend.delete(*self._keys(conversation_id))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+def create_message_cache():
+    backend = get_cache_backend()
+    if backend.shared:
+        return SharedMessageCache(backend, settings.message_cache_per_conversation, settings.shared_cache_ttl)
+    return MessageCache(settings.message_cache_bytes, settings.message_cache_per_conversation)
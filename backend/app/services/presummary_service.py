@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+from ..config import settings
+from ..metrics import PRESUMMARIES
+from .chat_service import chat_service
+from .stats_service import stats_service
+
+class PresummaryService:
+    # Summarizes idle conversations ahead of time so summarize requests hit the caches
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def start(cls):
+        if settings.presummary_enabled:
+            cls._task = asyncio.create_task(cls._loop())
+
+    @classmethod
+    async def stop(cls):
+        if cls._task:
+            cls._task.cancel()
+            await asyncio.gather(cls._task, return_exceptions=True)
+            cls._task = None
+
+    @classmethod
+    async def _loop(cls):
+        while True:
+            try:
+                await cls.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                PRESUMMARIES.inc(outcome='error')
+            await asyncio.sleep(settings.presummary_interval)
+
+    @staticmethod
+    async def run_once() -> int:
+        idle_since = datetime.utcnow() - timedelta(seconds=settings.presummary_idle_seconds)
+        conversation_ids = await stats_service.find_unsummarized(idle_since, settings.presummary_batch_size)
+        semaphore = asyncio.Semaphore(settings.presummary_concurrency)
+
+        async def presummarize(conversation_id: str) -> bool:
+            async with semaphore:
+                try:
+                    # Batch priority keeps interactive model calls ahead; the full analysis
+                    # also fills the summary-only cache entry
+                    summary = await chat_service.summarize_conversation(
+                        conversation_id,
+                        include_sentiment=True,
+                        include_keywords=True
+                    )
+                except Exception:
+                    # A rollup left behind by expired messages would fail forever
+                    if await chat_service.last_message_id(conversation_id) is None:
+                        await stats_service.drop_conversation(conversation_id)
+                        PRESUMMARIES.inc(outcome='dropped')
+                    else:
+                        await stats_service.record_presummary_failure(conversation_id)
+                        PRESUMMARIES.inc(outcome='failed')
+                    return False
+                # A reused summary document does not pass through the stats update
+                if summary.last_message_id:
+                    await stats_service.mark_summarized(conversation_id, summary.last_message_id)
+                PRESUMMARIES.inc(outcome='success')
+                return True
+
+        results = await asyncio.gather(*[presummarize(conversation_id) for conversation_id in conversation_ids])
+        return sum(results)
+
+presummary_service = PresummaryService()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from ..config import settings
+from ..database import db
+from ..metrics import PURGES
+from .stats_service import stats_service
+
+logger = logging.getLogger(__name__)
+
+class PurgeService:
+    # Deleted conversations are hidden at once through a tombstone holding the newest deleted
+    # message id, then purged in bounded batches in the background
+    _task: Optional[asyncio.Task] = None
+    _wake: Optional[asyncio.Event] = None
+
+    @classmethod
+    async def start(cls):
+        cls._wake = asyncio.Event()
+        cls._task = asyncio.create_task(cls._loop())
+
+    @classmethod
+    async def stop(cls):
+        if cls._task:
+            cls._task.cancel()
+            await asyncio.gather(cls._task, return_exceptions=True)
+            cls._task = None
+        cls._wake = None
+
+    @classmethod
+    async def schedule(cls, conversation_id: str, deleted_through: ObjectId, user_ids: List[str]):
+        db_instance = await db.get_db()
+        await db_instance.deleted_conversations.update_one(
+            {'_id': conversation_id},
+            {
+                '$max': {'deleted_through': deleted_through},
+                '$set': {'deleted_at': datetime.utcnow()},
+                '$addToSet': {'user_ids': {'$each': user_ids}},
+                '$setOnInsert': {'claimed_until': datetime.min}
+            },
+            upsert=True
+        )
+        # Without a running loop the purge happens on the next start
+        if cls._wake is not None:
+            cls._wake.set()
+
+    @staticmethod
+    async def deleted_through(conversation_id: str) -> Optional[ObjectId]:
+        db_instance = await db.get_db()
+        tombstone = await db_instance.deleted_conversations.find_one({'_id': conversation_id}, {'deleted_through': 1})
+        return tombstone['deleted_through'] if tombstone else None
+
+    @staticmethod
+    async def pending_filters(user_id: str) -> List[Dict]:
+        # Conditions matching the user's deleted messages that are not purged yet; only tombstones
+        # of conversations the user took part in are read, whatever the size of the purge backlog
+        db_instance = await db.get_db()
+        cursor = db_instance.deleted_conversations.find(
+            {'$or': [{'user_ids': user_id}, {'user_ids': {'$exists': False}}]},
+            {'deleted_through': 1}
+        )
+        return [
+            {'conversation_id': tombstone['_id'], '_id': {'$lte': tombstone['deleted_through']}}
+            async for tombstone in cursor
+        ]
+
+    @classmethod
+    async def _loop(cls):
+        while True:
+            try:
+                while await cls.purge_next():
+                    PURGES.inc(outcome='success')
+                if settings.message_retention_days is not None:
+                    cutoff = datetime.utcnow() - timedelta(days=settings.message_retention_days)
+                    await stats_service.reconcile_expired(cutoff, settings.purge_batch_size)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Background purge failed")
+                PURGES.inc(outcome='error')
+
+            # Woken by new deletes; the interval picks up work left by other processes
+            try:
+                await asyncio.wait_for(cls._wake.wait(), settings.purge_interval)
+            except asyncio.TimeoutError:
+                pass
+            cls._wake.clear()
+
+    @staticmethod
+    async def purge_next() -> bool:
+        db_instance = await db.get_db()
+        now = datetime.utcnow()
+        lease = timedelta(seconds=settings.purge_lease_seconds)
+
+        # Claim one tombstone so no other process purges it at the same time
+        tombstone = await db_instance.deleted_conversations.find_one_and_update(
+            {'claimed_until': {'$lt': now}},
+            {'$set': {'claimed_until': now + lease}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not tombstone:
+            return False
+
+        conversation_id = tombstone['_id']
+        deleted_through = tombstone['deleted_through']
+
+        async def purge_messages():
+            while True:
+                batch = await db_instance.messages.find(
+                    {'conversation_id': conversation_id, '_id': {'$lte': deleted_through}},
+                    {'user_id': 1}
+                ).sort('_id', 1).limit(settings.purge_batch_size).to_list(None)
+                if not batch:
+                    return
+                await db_instance.messages.delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+                await stats_service.subtract_user_messages(Counter(doc['user_id'] for doc in batch))
+                await db_instance.deleted_conversations.update_one(
+                    {'_id': conversation_id},
+                    {'$set': {'claimed_until': datetime.utcnow() + lease}}
+                )
+                # Leave room for other writes between batches
+                await asyncio.sleep(settings.purge_batch_pause)
+
+        async def purge_summaries():
+            await asyncio.gather(
+                db_instance.summaries.delete_many(
+                    {'conversation_id': conversation_id, 'created_at': {'$lte': tombstone['deleted_at']}}
+                ),
+                db_instance.summary_chunks.delete_many(
+                    {'conversation_id': conversation_id, 'created_at': {'$lte': tombstone['deleted_at']}}
+                )
+            )
+
+        try:
+            await asyncio.gather(purge_messages(), purge_summaries())
+        except Exception:
+            # Release the claim so the purge is retried
+            await db_instance.deleted_conversations.update_one(
+                {'_id': conversation_id},
+                {'$set': {'claimed_until': datetime.min}}
+            )
+            raise
+
+        # A delete that arrived meanwhile raised the watermark; keep the tombstone for another pass
+        result = await db_instance.deleted_conversations.delete_one(
+            {'_id': conversation_id, 'deleted_through': deleted_through}
+        )
+        if not result.deleted_count:
+            await db_instance.deleted_conversations.update_one(
+                {'_id': conversation_id},
+                {'$set': {'claimed_until': datetime.min}}
+            )
+        return True
+
+purge_service = PurgeService()
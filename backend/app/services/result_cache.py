@@ -0,0 +1,60 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, conversation_id, value), oldest first
+        self._entries: OrderedDict = OrderedDict()
+        self._keys_by_conversation: Dict[str, Set[str]] = {}
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, conversation_id: str):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, conversation_id, value)
+        self._keys_by_conversation.setdefault(conversation_id, set()).add(key)
+        
+        # Evict least recently used entries
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, conversation_id: str):
+        for key in self._keys_by_conversation.pop(conversation_id, set()):
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        hits = self.memory_hits + self.shared_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'memory_hits': self.memory_hits,
+            'shared_hits': self.shared_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+
+    def _remove(self, key: str):
+        _, conversation_id, _ = self._entries.pop(key)
+        keys = self._keys_by_conversation.get(conversation_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_conversation[conversation_id]
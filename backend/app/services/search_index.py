@@ -0,0 +1,18 @@
+import re
+from typing import Iterable, List
+
+TERM_PATTERN = re.compile(r'\w+')
+
+# Single characters match too much to be worth indexing
+MIN_TERM_LENGTH = 2
+
+def search_terms(text: str) -> List[str]:
+    # Distinct lowercase words; stored on every message and matched through the
+    # (conversation_id, terms) and (user_id, terms) indexes
+    return sorted({term for term in TERM_PATTERN.findall(text.lower()) if len(term) >= MIN_TERM_LENGTH})
+
+def search_score(query_terms: List[str], message_terms: Iterable[str]) -> float:
+    # Share of the query terms found in the message
+    if not query_terms:
+        return 0.0
+    return len(set(query_terms).intersection(message_terms)) / len(query_terms)
@@ -0,0 +1,233 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+from ..config import settings
+from ..database import db
+from ..models.chat import ChatSummary, ConversationStats, UserStats
+
+class StatsService:
+    # Rollups live in conversation_stats and user_stats, keyed by conversation and user id
+
+    @staticmethod
+    def _rollup_updates(docs: List[Dict], key: str) -> List[Tuple[str, Dict]]:
+        groups: Dict[str, Dict] = defaultdict(
+            lambda: {'count': 0, 'first': None, 'last': None, 'last_id': None, 'participants': set()}
+        )
+        for doc in docs:
+            group = groups[doc[key]]
+            group['count'] += 1
+            if group['last_id'] is None or doc['_id'] > group['last_id']:
+                group['last_id'] = doc['_id']
+            timestamp = doc.get('timestamp')
+            if timestamp is not None:
+                group['first'] = timestamp if group['first'] is None else min(group['first'], timestamp)
+                group['last'] = timestamp if group['last'] is None else max(group['last'], timestamp)
+            group['participants'].add(doc['user_id'])
+
+        updates = []
+        for value, group in groups.items():
+            update = {'$inc': {'message_count': group['count']}, '$max': {}}
+            if group['first'] is not None:
+                update['$min'] = {'first_message_at': group['first']}
+                update['$max']['last_message_at'] = group['last']
+            update['$max']['last_message_id'] = group['last_id']
+            if key == 'conversation_id':
+                update['$addToSet'] = {'participants': {'$each': sorted(group['participants'])}}
+            updates.append((value, update))
+        return updates
+
+    @staticmethod
+    async def record_messages(docs: List[Dict]):
+        # One upsert per conversation and per user, whatever the number of messages
+        if not docs:
+            return
+        db_instance = await db.get_db()
+        await asyncio.gather(*[
+            collection.update_one({'_id': value}, update, upsert=True)
+            for collection, key in ((db_instance.conversation_stats, 'conversation_id'), (db_instance.user_stats, 'user_id'))
+            for value, update in StatsService._rollup_updates(docs, key)
+        ])
+
+    @staticmethod
+    async def record_summary(summary: ChatSummary):
+        db_instance = await db.get_db()
+        update = {'$set': {'last_summary_id': summary.id}}
+        if summary.last_message_id:
+            update['$max'] = {'summarized_message_id': ObjectId(summary.last_message_id)}
+        if summary.sentiment:
+            update['$push'] = {'sentiment_trend': {
+                '$each': [{'summary_id': summary.id, 'sentiment': summary.sentiment, 'created_at': summary.created_at}],
+                '$slice': -settings.stats_sentiment_trend_size
+            }}
+        await db_instance.conversation_stats.update_one({'_id': summary.conversation_id}, update)
+
+    @staticmethod
+    async def mark_summarized(conversation_id: str, last_message_id: str):
+        db_instance = await db.get_db()
+        await db_instance.conversation_stats.update_one(
+            {'_id': conversation_id},
+            {
+                '$max': {'summarized_message_id': ObjectId(last_message_id)},
+                '$unset': {'presummary_failures': '', 'presummary_retry_at': ''}
+            }
+        )
+
+    @staticmethod
+    async def record_presummary_failure(conversation_id: str):
+        # Exponential backoff, so a conversation that keeps failing does not use a slot every pass
+        db_instance = await db.get_db()
+        doc = await db_instance.conversation_stats.find_one_and_update(
+            {'_id': conversation_id},
+            {'$inc': {'presummary_failures': 1}},
+            {'presummary_failures': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not doc:
+            return
+        delay = min(settings.presummary_interval * 2 ** (doc['presummary_failures'] - 1), settings.presummary_max_backoff)
+        await db_instance.conversation_stats.update_one(
+            {'_id': conversation_id},
+            {'$set': {'presummary_retry_at': datetime.utcnow() + timedelta(seconds=delay)}}
+        )
+
+    @staticmethod
+    async def find_unsummarized(idle_since: datetime, limit: int) -> List[str]:
+        # Conversations quiet since idle_since with messages newer than their latest summary and
+        # not backing off after a failure, oldest first
+        db_instance = await db.get_db()
+        cursor = db_instance.conversation_stats.find(
+            {
+                'last_message_at': {'$lt': idle_since},
+                'presummary_retry_at': {'$not': {'$gt': datetime.utcnow()}},
+                '$expr': {'$gt': ['$last_message_id', '$summarized_message_id']}
+            },
+            {'_id': 1}
+        ).sort('last_message_at', 1).limit(limit)
+        return [doc['_id'] async for doc in cursor]
+
+    @staticmethod
+    async def drop_conversation(conversation_id: str) -> Optional[List[str]]:
+        # Returns the participants of the dropped rollup, if there was one
+        db_instance = await db.get_db()
+        doc = await db_instance.conversation_stats.find_one_and_delete({'_id': conversation_id}, {'participants': 1})
+        return doc.get('participants', []) if doc else None
+
+    @staticmethod
+    async def subtract_user_messages(counts: Dict[str, int]):
+        # Per-user counts shrink as the messages of deleted conversations are purged
+        if not counts:
+            return
+        db_instance = await db.get_db()
+        await asyncio.gather(*[
+            db_instance.user_stats.update_one({'_id': user_id}, {'$inc': {'message_count': -count}})
+            for user_id, count in counts.items()
+        ])
+
+    @staticmethod
+    async def reconcile_expired(cutoff: datetime, limit: int) -> int:
+        # Messages removed by a TTL index never pass through the rollups. Recount the rollups whose
+        # oldest message is past the cutoff, treating older messages as expired; only messages up
+        # to the rollup's newest id are counted, and the write is skipped if a concurrent insert or
+        # purge changed the count meanwhile
+        db_instance = await db.get_db()
+        reconciled = 0
+        for collection, key in ((db_instance.conversation_stats, 'conversation_id'), (db_instance.user_stats, 'user_id')):
+            docs = await collection.find(
+                {'first_message_at': {'$lt': cutoff}},
+                {'message_count': 1, 'last_message_id': 1}
+            ).limit(limit).to_list(None)
+            for doc in docs:
+                query = {key: doc['_id'], 'timestamp': {'$gte': cutoff}}
+                if doc.get('last_message_id'):
+                    query['_id'] = {'$lte': doc['last_message_id']}
+                count = await db_instance.messages.count_documents(query)
+                unchanged = {'_id': doc['_id'], 'message_count': doc['message_count']}
+                if count == 0 and (await collection.delete_one(unchanged)).deleted_count:
+                    reconciled += 1
+                    continue
+
+                first = await db_instance.messages.find_one(
+                    {key: doc['_id'], 'timestamp': {'$gte': cutoff}},
+                    {'timestamp': 1},
+                    sort=[('timestamp', 1)]
+                )
+                result = await collection.update_one(unchanged, {'$set': {
+                    'message_count': count,
+                    'first_message_at': first['timestamp'] if first else cutoff
+                }})
+                reconciled += result.modified_count
+        return reconciled
+
+    @staticmethod
+    async def get_conversation_stats(conversation_id: str) -> Optional[ConversationStats]:
+        db_instance = await db.get_db()
+        doc = await db_instance.conversation_stats.find_one({'_id': conversation_id})
+        if not doc:
+            return None
+        doc['conversation_id'] = doc.pop('_id')
+        return ConversationStats(**doc)
+
+    @staticmethod
+    async def get_user_stats(user_id: str) -> Optional[UserStats]:
+        db_instance = await db.get_db()
+        doc = await db_instance.user_stats.find_one({'_id': user_id})
+        if not doc:
+            return None
+        doc['user_id'] = doc.pop('_id')
+        return UserStats(**doc)
+
+    @staticmethod
+    async def rebuild():
+        # Recomputes every rollup from the source collections; run while writes are paused
+        db_instance = await db.get_db()
+        await db_instance.conversation_stats.delete_many({})
+        await db_instance.user_stats.delete_many({})
+
+        # Older documents may hold ISO strings instead of dates
+        timestamp = {'$toDate': '$timestamp'}
+        await db_instance.messages.aggregate([
+            {'$group': {
+                '_id': '$conversation_id',
+                'message_count': {'$sum': 1},
+                'first_message_at': {'$min': timestamp},
+                'last_message_at': {'$max': timestamp},
+                'last_message_id': {'$max': '$_id'},
+                'participants': {'$addToSet': '$user_id'}
+            }},
+            {'$merge': {'into': 'conversation_stats', 'whenMatched': 'replace'}}
+        ]).to_list(None)
+        await db_instance.messages.aggregate([
+            {'$group': {
+                '_id': '$user_id',
+                'message_count': {'$sum': 1},
+                'first_message_at': {'$min': timestamp},
+                'last_message_at': {'$max': timestamp},
+                'last_message_id': {'$max': '$_id'}
+            }},
+            {'$merge': {'into': 'user_stats', 'whenMatched': 'replace'}}
+        ]).to_list(None)
+
+        # Latest summary and sentiment trend from the stored summaries
+        await db_instance.summaries.aggregate([
+            {'$sort': {'created_at': 1}},
+            {'$group': {
+                '_id': '$conversation_id',
+                'last_summary_id': {'$last': {'$toString': '$_id'}},
+                'summarized_message_id': {'$max': {'$toObjectId': '$last_message_id'}},
+                'sentiment_trend': {'$push': {
+                    'summary_id': {'$toString': '$_id'},
+                    'sentiment': '$sentiment',
+                    'created_at': '$created_at'
+                }}
+            }},
+            {'$set': {'sentiment_trend': {'$slice': [
+                {'$filter': {'input': '$sentiment_trend', 'cond': {'$ifNull': ['$$this.sentiment', False]}}},
+                -settings.stats_sentiment_trend_size
+            ]}}},
+            {'$merge': {'into': 'conversation_stats', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}}
+        ]).to_list(None)
+
+stats_service = StatsService()
@@ -0,0 +1,214 @@
+"""End-to-end latency and throughput benchmark for the /chats API.
+
+Drives the FastAPI app in-process through an ASGI client, with the fake LLM
+provider standing in for Gemini. MongoDB is a local mongod (MONGODB_URL,
+default mongodb://localhost:27017), or mongomock-motor with --mongomock.
+mongomock does not support text search, so the search scenario reports
+errors in that mode.
+
+Run from the backend directory (needs httpx):
+
+    python -m benchmarks.api --output results.json
+    python -m benchmarks.api --output new.json --compare results.json
+
+Every scenario is run at every conversation size and concurrency level.
+Results are written as JSON with p50/p95/p99 latency and requests/second.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+
+os.environ.setdefault('MONGODB_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('LLM_PROVIDER', 'fake')
+os.environ.setdefault('FAKE_LLM_LATENCY_MEAN', '0.05')
+os.environ.setdefault('FAKE_LLM_LATENCY_STDDEV', '0.01')
+os.environ.setdefault('FAKE_LLM_SEED', '1')
+os.environ.setdefault('LLM_RATE_PER_SECOND', '100000')
+os.environ.setdefault('LLM_BURST', '100000')
+os.environ.setdefault('LLM_MAX_IN_FLIGHT', '1000')
+
+import httpx
+
+USER_ID = 'bench_user'
+WORDS = ['deploy', 'invoice', 'meeting', 'budget', 'release', 'server', 'design', 'report', 'client', 'review']
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+
+async def seed_conversation(client, conversation_id, size):
+    lines = []
+    for i in range(size):
+        lines.append(json.dumps({
+            'conversation_id': conversation_id,
+            'user_id': USER_ID if i % 2 == 0 else 'bot',
+            'message': f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} message number {i}",
+            'timestamp': datetime.utcnow().isoformat(),
+            'metadata': {}
+        }))
+    response = await client.post(
+        '/chats/bulk',
+        content='\n'.join(lines),
+        headers={'content-type': 'application/x-ndjson'}
+    )
+    response.raise_for_status()
+
+
+def scenarios(conversation_id):
+    return {
+        'post_message': lambda i: ('POST', '/chats', {
+            'conversation_id': conversation_id,
+            'user_id': USER_ID,
+            'message': f"benchmark question {i}",
+            'metadata': {}
+        }),
+        'get_conversation': lambda i: ('GET', f'/chats/{conversation_id}', None),
+        'search_conversation': lambda i: ('GET', f'/chats/{conversation_id}?search_query={WORDS[i % len(WORDS)]}', None),
+        'user_history': lambda i: ('GET', f'/chats/users/{USER_ID}/messages?page={i % 5 + 1}&limit=20', None),
+        'summarize': lambda i: ('POST', '/chats/summarize', {
+            'conversation_id': conversation_id,
+            'include_sentiment': True,
+            'include_keywords': True
+        }),
+    }
+
+
+async def run_scenario(client, make_request, requests, concurrency):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, body = make_request(i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'rps': requests / wall
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['scenario'], r['size'], r['concurrency']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')})")
+    print(f"{'scenario':<20} {'size':>6} {'conc':>5} {'p95 change':>11} {'rps change':>11}")
+    for r in results:
+        old = previous.get((r['scenario'], r['size'], r['concurrency']))
+        if not old:
+            continue
+        p95 = (r['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+        rps = (r['rps'] - old['rps']) / old['rps'] * 100
+        print(f"{r['scenario']:<20} {r['size']:>6} {r['concurrency']:>5} {p95:>+10.1f}% {rps:>+10.1f}%")
+
+
+async def main(args):
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        import app.database
+        app.database.AsyncIOMotorClient = AsyncMongoMockClient
+
+    from app.main import app
+    from app.services.chat_service import chat_service
+    from app.services.purge_service import purge_service
+
+    await app.router.startup()
+    transport = httpx.ASGITransport(app=app)
+    run_id = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    results = []
+    conversation_ids = []
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+            for size in args.sizes:
+                conversation_id = f"bench-{run_id}-{size}"
+                conversation_ids.append(conversation_id)
+                await seed_conversation(client, conversation_id, size)
+
+                for name, make_request in scenarios(conversation_id).items():
+                    if args.scenarios and name not in args.scenarios:
+                        continue
+                    for concurrency in args.concurrency:
+                        result = await run_scenario(client, make_request, args.requests, concurrency)
+                        result.update(scenario=name, size=size, concurrency=concurrency)
+                        results.append(result)
+                        print(
+                            f"{name:<20} size={size:<6} conc={concurrency:<4} "
+                            f"p50={result['p50_ms']:8.1f}ms p95={result['p95_ms']:8.1f}ms "
+                            f"p99={result['p99_ms']:8.1f}ms {result['rps']:8.1f} req/s "
+                            f"errors={result['errors']}"
+                        )
+    finally:
+        for conversation_id in conversation_ids:
+            await chat_service.delete_message(conversation_id)
+        while await purge_service.purge_next():
+            pass
+        await app.router.shutdown()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'config': {
+            'sizes': args.sizes,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'mongomock': args.mongomock
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1_000, 10_000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario, size and concurrency level')
+    parser.add_argument('--scenarios', nargs='+', help='only run these scenarios')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--mongomock', action='store_true', help='use mongomock-motor instead of a local mongod')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
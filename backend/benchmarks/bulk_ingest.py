@@ -0,0 +1,76 @@
+"""Compare message ingestion throughput: per-message inserts vs POST /chats/bulk.
+
+Requires a reachable MongoDB (MONGODB_URL, default mongodb://localhost:27017).
+Run from the backend directory:
+
+    python -m benchmarks.bulk_ingest [message_count]
+
+Messages are written as the 'bot' user so the per-message path skips reply
+generation, and everything written is deleted afterwards.
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+os.environ.setdefault('MONGODB_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+from app.database import db
+from app.models.chat import ChatMessage
+from app.services.chat_service import chat_service
+from app.services.purge_service import purge_service
+
+
+def make_records(conversation_id: str, count: int):
+    return [
+        {
+            'conversation_id': conversation_id,
+            'user_id': 'bot',
+            'message': f"Imported message {i}",
+            'timestamp': datetime.utcnow().isoformat(),
+            'metadata': {}
+        }
+        for i in range(count)
+    ]
+
+
+async def records_iter(records):
+    for record in records:
+        yield record
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    run_id = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    single_id = f"bench-single-{run_id}"
+    bulk_id = f"bench-bulk-{run_id}"
+    await db.connect_db()
+
+    try:
+        records = make_records(single_id, count)
+        start = time.perf_counter()
+        for record in records:
+            await chat_service.create_message(ChatMessage(**record))
+        single_time = time.perf_counter() - start
+
+        records = make_records(bulk_id, count)
+        start = time.perf_counter()
+        result = await chat_service.bulk_create_messages(records_iter(records))
+        bulk_time = time.perf_counter() - start
+    finally:
+        await chat_service.delete_message(single_id)
+        await chat_service.delete_message(bulk_id)
+        while await purge_service.purge_next():
+            pass
+
+    print(f"{count} messages")
+    print(f"per-message: {single_time:8.2f}s {count / single_time:10.0f} msg/s")
+    print(f"bulk:        {bulk_time:8.2f}s {result.inserted / bulk_time:10.0f} msg/s "
+          f"({len(result.errors)} errors)")
+    print(f"speedup:     {single_time / bulk_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
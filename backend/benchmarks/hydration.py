@@ -0,0 +1,88 @@
+"""Measure the CPU time and memory of turning message documents into objects.
+
+Compares validated ChatMessage models against MessageRow, the unvalidated
+row used for prompt building and summarization, over documents shaped like
+those returned by MongoDB. No database is needed. Run from the backend
+directory:
+
+    python -m benchmarks.hydration [message_count]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+os.environ.setdefault('MONGODB_URL', 'mongodb://localhost:27017')
+
+from app.models.chat import ChatMessage, MessageRow
+
+REPEATS = 5
+
+
+def make_docs(count: int):
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            '_id': ObjectId(),
+            'conversation_id': 'benchmark',
+            'user_id': 'bot' if i % 2 else 'user',
+            'message': f"Message {i}: a typical chat line about the topic under discussion.",
+            'timestamp': start + timedelta(seconds=i),
+            'metadata': {'client': 'web'}
+        }
+        for i in range(count)
+    ]
+
+
+def hydrate_models(docs):
+    return [ChatMessage(**doc) for doc in docs]
+
+
+def hydrate_rows(docs):
+    return [MessageRow.from_doc(doc) for doc in docs]
+
+
+def measure(hydrate, docs):
+    # Best-of CPU time, then retained and peak allocations of a single run
+    best = None
+    for _ in range(REPEATS):
+        gc.collect()
+        start = time.process_time()
+        hydrate(docs)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    result = hydrate(docs)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, retained, peak
+
+
+def main(count: int):
+    docs = make_docs(count)
+    print(f"{count} messages, best of {REPEATS} runs")
+    print(f"{'representation':<16} {'cpu ms':>9} {'retained KiB':>13} {'peak KiB':>10}")
+
+    results = {}
+    for name, hydrate in [('ChatMessage', hydrate_models), ('MessageRow', hydrate_rows)]:
+        results[name] = measure(hydrate, docs)
+        cpu, retained, peak = results[name]
+        print(f"{name:<16} {cpu * 1000:>9.1f} {retained / 1024:>13.1f} {peak / 1024:>10.1f}")
+
+    model_cpu, model_retained, _ = results['ChatMessage']
+    row_cpu, row_retained, _ = results['MessageRow']
+    print(
+        f"\nMessageRow: {model_cpu / row_cpu:.1f}x less CPU, "
+        f"{(model_retained - row_retained) / 1024:.1f} KiB less retained memory"
+    )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
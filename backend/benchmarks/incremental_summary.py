@@ -0,0 +1,122 @@
+"""Compare full re-summarization against incremental rolling summaries.
+
+Run from the backend directory:
+
+    python -m benchmarks.incremental_summary
+
+The model provider is replaced by one whose latency grows with the prompt size,
+so the numbers reflect prompt volume rather than network conditions.
+"""
+import asyncio
+import os
+import time
+
+from bson import ObjectId
+
+os.environ.setdefault('MONGODB_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+from app.models.chat import MessageRow
+from app.services.gemini_service import GeminiService
+from app.services.llm_provider import LLMProvider
+from app.services.llm_scheduler import LLMScheduler
+from app.services.result_cache import ResultCache
+
+SIZES = [100, 1_000, 10_000]
+NEW_MESSAGES = 20
+SUMMARY_TEXT = "The participants discussed the project timeline, open issues and next steps. " * 4
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough heuristic used by most tokenizers for English text
+    return max(1, len(text) // 4)
+
+
+class SizedLatencyProvider(LLMProvider):
+    model_name = 'sized-latency'
+
+    def __init__(self, base_latency: float = 0.05, per_token_latency: float = 0.00002):
+        self.base_latency = base_latency
+        self.per_token_latency = per_token_latency
+        self.prompt_tokens = 0
+
+    async def generate(self, prompt: str, response_schema=None) -> str:
+        tokens = estimate_tokens(prompt)
+        self.prompt_tokens += tokens
+        await asyncio.sleep(self.base_latency + tokens * self.per_token_latency)
+        return SUMMARY_TEXT
+
+    async def stream(self, prompt: str):
+        yield await self.generate(prompt)
+
+
+def make_messages(count: int):
+    return [
+        MessageRow(
+            str(ObjectId()),
+            'benchmark',
+            'bot' if i % 2 else 'user',
+            f"Message {i}: a typical chat line about the topic under discussion."
+        )
+        for i in range(count)
+    ]
+
+
+async def no_cache(kind: str, key: str):
+    return None
+
+
+async def no_store(key: str, conversation_id: str, summary: str):
+    pass
+
+
+def make_service() -> GeminiService:
+    # Caching is disabled so every call reaches the model
+    service = GeminiService.__new__(GeminiService)
+    service.cache = ResultCache()
+    service.scheduler = LLMScheduler(rate_per_second=1000, burst=1000)
+    service._get_cached = no_cache
+    service._store_chunk = no_store
+    return service
+
+
+def use_provider(service: GeminiService, provider: SizedLatencyProvider):
+    service.provider = provider
+    service.model_name = provider.model_name
+
+
+async def run(size: int):
+    service = make_service()
+    history = make_messages(size + NEW_MESSAGES)
+    new_messages = history[size:]
+
+    provider = SizedLatencyProvider()
+    use_provider(service, provider)
+    start = time.perf_counter()
+    await service.generate_summary(history)
+    full_time = time.perf_counter() - start
+    full_tokens = provider.prompt_tokens
+
+    provider = SizedLatencyProvider()
+    use_provider(service, provider)
+    start = time.perf_counter()
+    await service.generate_incremental_summary(SUMMARY_TEXT, new_messages)
+    incremental_time = time.perf_counter() - start
+    incremental_tokens = provider.prompt_tokens
+
+    return full_tokens, full_time, incremental_tokens, incremental_time
+
+
+async def main():
+    print(f"{NEW_MESSAGES} new messages per summarize call")
+    print(f"{'messages':>10} {'full tokens':>12} {'full ms':>9} {'incr tokens':>12} {'incr ms':>9} {'speedup':>8}")
+    for size in SIZES:
+        full_tokens, full_time, incr_tokens, incr_time = await run(size)
+        print(
+            f"{size:>10} {full_tokens:>12} {full_time * 1000:>9.1f} "
+            f"{incr_tokens:>12} {incr_time * 1000:>9.1f} {full_time / incr_time:>7.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""Compare the old regex message search against word search as the corpus grows.
+
+Requires a reachable MongoDB (MONGODB_URL, default mongodb://localhost:27017).
+Run from the backend directory:
+
+    python -m benchmarks.search [messages_per_conversation] [conversations]
+
+Every conversation is seeded from the same vocabulary, so common words match
+across the whole corpus. One conversation and its user are searched while
+other conversations are added in steps; searches served by the
+(conversation_id, terms) and (user_id, terms) indexes should stay flat as the
+corpus grows. The seeded conversations are deleted at the end.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+os.environ.setdefault('MONGODB_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+from app.database import db
+from app.services.chat_service import chat_service
+from app.services.purge_service import purge_service
+from app.services.search_index import search_terms
+
+WORDS = ['deploy', 'invoice', 'meeting', 'budget', 'release', 'server', 'design', 'report', 'client', 'review']
+COMMON_WORD = 'budget'
+RARE_WORD = 'kubernetes'
+RUNS = 20
+
+
+async def timed(query_fn):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        results = await query_fn()
+    return (time.perf_counter() - start) / RUNS, len(results)
+
+
+async def seed(db_instance, conversation_id: str, user_id: str, count: int):
+    docs = []
+    for i in range(count):
+        words = random.choices(WORDS, k=8)
+        if i % 1000 == 0:
+            words.append(RARE_WORD)
+        message = ' '.join(words)
+        docs.append({
+            'conversation_id': conversation_id,
+            'user_id': user_id,
+            'message': message,
+            'terms': search_terms(message),
+            'timestamp': datetime.utcnow(),
+            'metadata': {}
+        })
+    await db_instance.messages.insert_many(docs, ordered=False)
+
+
+async def main():
+    per_conversation = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    max_conversations = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    prefix = f"bench-search-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    target, target_user = f"{prefix}-0", f"{prefix}-user-0"
+    db_instance = await db.get_db()
+
+    def regex_search(word):
+        async def run():
+            cursor = db_instance.messages.find({
+                'conversation_id': target,
+                'message': {'$regex': word, '$options': 'i'}
+            }).sort('timestamp', 1)
+            return await cursor.to_list(None)
+        return run
+
+    def word_search(word):
+        return lambda: chat_service.get_message(target, search_query=word)
+
+    def user_search(word):
+        return lambda: chat_service.search_user_messages(target_user, word)
+
+    seeded = 0
+    steps = sorted({1, *[n for n in (10, 100, 1_000, 10_000) if n <= max_conversations], max_conversations})
+    print(f"{per_conversation} messages per conversation, {RUNS} runs each")
+    print(f"{'conversations':>13} {'messages':>9} {'word':>10} {'regex ms':>9} {'search ms':>10} {'user ms':>8} {'hits':>6}")
+    try:
+        for total in steps:
+            while seeded < total:
+                await seed(db_instance, f"{prefix}-{seeded}", f"{prefix}-user-{seeded}", per_conversation)
+                seeded += 1
+            for word in (COMMON_WORD, RARE_WORD):
+                regex_time, regex_hits = await timed(regex_search(word))
+                search_time, search_hits = await timed(word_search(word))
+                user_time, _ = await timed(user_search(word))
+                assert regex_hits == search_hits
+                print(
+                    f"{total:>13} {total * per_conversation:>9} {word:>10} "
+                    f"{regex_time * 1000:>9.2f} {search_time * 1000:>10.2f} {user_time * 1000:>8.2f} {search_hits:>6}"
+                )
+    finally:
+        for i in range(seeded):
+            await chat_service.delete_message(f"{prefix}-{i}")
+        while await purge_service.purge_next():
+            pass
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
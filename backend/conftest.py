@@ -0,0 +1 @@
+# Puts backend/ on sys.path so the tests import the app package as the server does
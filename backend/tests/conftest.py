@@ -0,0 +1,29 @@
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from app.config import get_settings
+from app.database import Database
+from app.services.chat_service import ChatService
+
+@pytest.fixture
+def api(monkeypatch):
+    # The app on a fresh in-memory MongoDB with the fake model; background services are not started
+    monkeypatch.setenv('MONGODB_URL', 'mongodb://localhost:27017')
+    monkeypatch.setenv('MONGODB_ENSURE_INDEXES', 'false')
+    monkeypatch.setenv('LLM_PROVIDER', 'fake')
+    monkeypatch.setenv('FAKE_LLM_LATENCY_MEAN', '0')
+    monkeypatch.setenv('FAKE_LLM_LATENCY_STDDEV', '0')
+    monkeypatch.setattr('app.database.AsyncIOMotorClient', AsyncMongoMockClient)
+    get_settings.cache_clear()
+    monkeypatch.setattr(Database, 'client', None)
+    monkeypatch.setattr(Database, 'db', None)
+    monkeypatch.setattr(Database, '_lock', None)
+    monkeypatch.setattr(ChatService, '_message_cache', None)
+
+    from app.main import app
+
+    def client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test')
+
+    yield client
+    get_settings.cache_clear()
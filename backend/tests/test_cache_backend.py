@@ -0,0 +1,66 @@
+import asyncio
+from app.services.cache_backend import RedisBackend
+
+async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # Replies to GET with the key itself, after a delay for keys starting with "slow"
+    try:
+        while True:
+            count = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args = []
+            for _ in range(count):
+                length = int((await reader.readuntil(b"\r\n"))[1:-2])
+                args.append((await reader.readexactly(length + 2))[:-2])
+            key = args[1]
+            if key.startswith(b'slow'):
+                await asyncio.sleep(0.2)
+            writer.write(b"$%d\r\n%s\r\n" % (len(key), key))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+def test_cancelled_command_does_not_leak_its_reply():
+    async def scenario():
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0", pool_size=1)
+        async with server:
+            slow = asyncio.create_task(backend.get('slow-key'))
+            await asyncio.sleep(0.05)
+            slow.cancel()
+            await asyncio.gather(slow, return_exceptions=True)
+
+            # The late reply to the cancelled GET must not be read as this one's
+            assert await backend.get('next-key') == 'next-key'
+            await asyncio.sleep(0.3)
+            assert await backend.get('other-key') == 'other-key'
+
+    asyncio.run(scenario())
+
+def test_pool_runs_commands_concurrently():
+    async def scenario():
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0", pool_size=4)
+        async with server:
+            start = asyncio.get_running_loop().time()
+            results = await asyncio.gather(*[backend.get(f"slow-{i}") for i in range(4)])
+            elapsed = asyncio.get_running_loop().time() - start
+        assert results == [f"slow-{i}" for i in range(4)]
+        assert elapsed < 0.6
+
+    asyncio.run(scenario())
+
+def test_replace_list_is_one_script_call():
+    async def scenario():
+        backend = RedisBackend('redis://127.0.0.1:6379/0')
+        commands = []
+
+        async def execute(*args):
+            commands.append(args)
+
+        backend.execute = execute
+        await backend.replace_list('list', ['a', 'b'], 60, 'state', 'complete')
+        assert len(commands) == 1
+        assert commands[0][0] == 'EVAL' and commands[0][2:] == (2, 'list', 'state', 60, 'complete', 'a', 'b')
+
+    asyncio.run(scenario())
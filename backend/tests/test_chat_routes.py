@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+def seed(conversation_id: str, count: int, user_id: str = 'u1') -> str:
+    return '\n'.join(
+        json.dumps({'conversation_id': conversation_id, 'user_id': user_id, 'message': f"message {i}"})
+        for i in range(count)
+    )
+
+def test_conversation_export_streams_ndjson(api):
+    async def scenario():
+        async with api() as client:
+            response = await client.post(
+                '/chats/bulk',
+                content=seed('c1', 3),
+                headers={'Content-Type': 'application/x-ndjson'}
+            )
+            assert response.status_code == 200
+
+            for request in (
+                client.get('/chats/c1', params={'stream': 'true'}),
+                client.get('/chats/c1', headers={'Accept': 'application/x-ndjson'})
+            ):
+                response = await request
+                assert response.status_code == 200
+                assert response.headers['content-type'].startswith('application/x-ndjson')
+                rows = [json.loads(line) for line in response.text.splitlines()]
+                assert [row['message'] for row in rows] == ['message 0', 'message 1', 'message 2']
+
+    asyncio.run(scenario())
+
+def test_deleted_conversation_summary_is_not_reused(api):
+    from app.services.chat_service import chat_service
+
+    async def scenario():
+        async with api() as client:
+            headers = {'Content-Type': 'application/x-ndjson'}
+            await client.post('/chats/bulk', content=seed('c1', 3), headers=headers)
+            request = {'conversation_id': 'c1', 'incremental': True}
+            old = (await client.post('/chats/summarize', json=request)).json()
+            assert (await client.delete('/chats/c1')).status_code == 200
+
+            # The purge has not run, but the old summary is already hidden
+            assert await chat_service.get_latest_summary('c1') is None
+
+            await client.post('/chats/bulk', content=seed('c1', 1), headers=headers)
+            new = (await client.post('/chats/summarize', json=request)).json()
+            assert new['summary'] != old['summary']
+            assert new['last_message_id'] > old['last_message_id']
+
+    asyncio.run(scenario())
+
+def test_user_history_only_checks_the_users_own_deletes(api):
+    from app.services.purge_service import purge_service
+
+    async def scenario():
+        async with api() as client:
+            headers = {'Content-Type': 'application/x-ndjson'}
+            await client.post('/chats/bulk', content=seed('c1', 2), headers=headers)
+            await client.post('/chats/bulk', content=seed('c2', 2), headers=headers)
+            await client.post('/chats/bulk', content=seed('c3', 2, user_id='u2'), headers=headers)
+            await client.delete('/chats/c1')
+            await client.delete('/chats/c3')
+
+            pending = await purge_service.pending_filters('u1')
+            assert [condition['conversation_id'] for condition in pending] == ['c1']
+
+            page = (await client.get('/chats/users/u1/messages')).json()
+            assert {msg['conversation_id'] for msg in page['data']} == {'c2'}
+
+    asyncio.run(scenario())
+
+def test_malformed_analysis_is_a_bad_gateway(api, monkeypatch):
+    from app.services.gemini_service import gemini_service
+    from app.services.llm_provider import FakeProvider
+
+    class MalformedProvider(FakeProvider):
+        async def generate(self, prompt, response_schema=None):
+            text = await super().generate(prompt)
+            return '{"sentiment": "unsure"}' if response_schema else text
+
+    monkeypatch.setattr(gemini_service, 'provider', MalformedProvider(latency_mean=0, latency_stddev=0))
+
+    async def scenario():
+        async with api() as client:
+            await client.post('/chats/bulk', content=seed('c1', 3), headers={'Content-Type': 'application/x-ndjson'})
+            response = await client.post(
+                '/chats/summarize',
+                json={'conversation_id': 'c1', 'include_sentiment': True, 'include_keywords': True}
+            )
+            assert response.status_code == 502
+
+    asyncio.run(scenario())
+
+def test_word_search_within_a_conversation_and_across_a_users(api):
+    async def scenario():
+        async with api() as client:
+            messages = [
+                ('c1', 'u1', 'Deploy the release tonight'),
+                ('c1', 'u1', 'The budget review is tomorrow'),
+                ('c2', 'u1', 'Release notes for the budget'),
+                ('c3', 'u2', 'Budget release for another user'),
+            ]
+            content = '\n'.join(
+                json.dumps({'conversation_id': cid, 'user_id': uid, 'message': text}) for cid, uid, text in messages
+            )
+            await client.post('/chats/bulk', content=content, headers={'Content-Type': 'application/x-ndjson'})
+
+            found = (await client.get('/chats/c1', params={'search_query': 'RELEASE'})).json()
+            assert [msg['message'] for msg in found] == ['Deploy the release tonight']
+            assert all('terms' not in msg for msg in found)
+
+            results = (await client.get('/chats/users/u1/search', params={'q': 'budget release'})).json()
+            assert [msg['message'] for msg in results] == [
+                'Release notes for the budget',
+                'The budget review is tomorrow',
+                'Deploy the release tonight',
+            ]
+            assert [msg['score'] for msg in results] == [1.0, 0.5, 0.5]
+
+    asyncio.run(scenario())
+
+def test_since_returns_later_messages_in_insertion_order(api):
+    async def scenario():
+        async with api() as client:
+            # Client-set timestamps that disagree with the order the messages were stored in
+            content = '\n'.join(
+                json.dumps({'conversation_id': 'c1', 'user_id': 'u1', 'message': f"message {i}", 'timestamp': timestamp})
+                for i, timestamp in enumerate(['2024-01-01T00:00:00', '2024-01-03T00:00:00', '2024-01-02T00:00:00'])
+            )
+            await client.post('/chats/bulk', content=content, headers={'Content-Type': 'application/x-ndjson'})
+
+            everything = (await client.get('/chats/c1')).json()
+            assert [msg['message'] for msg in everything] == ['message 0', 'message 2', 'message 1']
+
+            later = (await client.get('/chats/c1', params={'since': everything[0]['_id']})).json()
+            assert [msg['message'] for msg in later] == ['message 1', 'message 2']
+            assert later[-1]['_id'] == max(msg['_id'] for msg in everything)
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+import asyncio
+import time
+import pytest
+from app.services.llm_provider import FakeModelError, FakeProvider
+from app.services.llm_scheduler import LLMScheduler, ModelOverloadedError, ModelTimeoutError, Priority
+
+def scheduler(**options) -> LLMScheduler:
+    options = {'rate_per_second': 1000.0, 'burst': 1000, 'max_in_flight': 4, 'timeout': 5.0, 'max_attempts': 3, **options}
+    return LLMScheduler(**options)
+
+def test_interactive_calls_go_before_queued_batch_calls():
+    async def scenario():
+        llm = scheduler(max_in_flight=1)
+        release = asyncio.Event()
+        order = []
+
+        async def hold():
+            await release.wait()
+
+        def record(name):
+            async def call():
+                order.append(name)
+            return call
+
+        holder = asyncio.create_task(llm.run(hold))
+        await asyncio.sleep(0.01)
+        queued = [
+            asyncio.create_task(llm.run(record('batch-1'), Priority.BATCH)),
+            asyncio.create_task(llm.run(record('batch-2'), Priority.BATCH)),
+        ]
+        await asyncio.sleep(0.01)
+        queued.append(asyncio.create_task(llm.run(record('interactive'), Priority.INTERACTIVE)))
+        await asyncio.sleep(0.01)
+        assert llm.stats()['queued'] == 3
+
+        release.set()
+        await asyncio.gather(holder, *queued)
+        assert order == ['interactive', 'batch-1', 'batch-2']
+
+    asyncio.run(scenario())
+
+def test_transient_errors_are_retried():
+    async def scenario():
+        llm = scheduler()
+        provider = FakeProvider(latency_mean=0, latency_stddev=0, error_rate=1, error_code=503)
+
+        async def flaky():
+            # Fails once, then the fake recovers
+            if provider.calls == 1:
+                provider.error_rate = 0
+            return await provider.generate('hello')
+
+        assert (await llm.run(flaky)).startswith('Fake response')
+        assert provider.calls == 2
+        assert llm.stats()['retries'] == 1
+
+    asyncio.run(scenario())
+
+def test_exhausted_quota_raises_model_overloaded():
+    async def scenario():
+        llm = scheduler()
+        provider = FakeProvider(latency_mean=0, latency_stddev=0, error_rate=1, error_code=429)
+
+        with pytest.raises(ModelOverloadedError):
+            await llm.run(lambda: provider.generate('hello'))
+        assert provider.calls == llm.max_attempts
+        assert llm.stats()['throttled'] == llm.max_attempts
+
+    asyncio.run(scenario())
+
+def test_client_errors_are_not_retried():
+    async def scenario():
+        llm = scheduler()
+        provider = FakeProvider(latency_mean=0, latency_stddev=0, error_rate=1, error_code=400)
+
+        with pytest.raises(FakeModelError):
+            await llm.run(lambda: provider.generate('hello'))
+        assert provider.calls == 1
+
+    asyncio.run(scenario())
+
+def test_slow_calls_raise_model_timeout_at_the_deadline():
+    async def scenario():
+        llm = scheduler()
+        provider = FakeProvider(latency_mean=5, latency_stddev=0)
+
+        start = time.monotonic()
+        with pytest.raises(ModelTimeoutError):
+            await llm.run(lambda: provider.generate('hello'), timeout=0.1)
+        assert time.monotonic() - start < 1
+        assert llm.stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from app.services.cache_backend import MemoryBackend
+from app.services.message_cache import MessageCache, SharedMessageCache
+
+def message(text: str):
+    return {'_id': ObjectId(), 'conversation_id': 'c1', 'user_id': 'u1', 'message': text}
+
+def caches():
+    return [MessageCache(), SharedMessageCache(MemoryBackend())]
+
+def test_read_racing_an_insert_is_not_cached():
+    async def scenario(cache):
+        stored = [message('first')]
+
+        # The read starts before the insert and returns without it
+        generation = await cache.generation('c1')
+        snapshot = list(stored)
+        stored.append(message('second'))
+        await cache.append('c1', stored[-1])
+
+        assert not await cache.put('c1', snapshot, complete=True, generation=generation)
+        assert await cache.get_all('c1') is None
+
+        # The next read sees both messages and fills the cache
+        generation = await cache.generation('c1')
+        assert await cache.put('c1', list(stored), complete=True, generation=generation)
+        assert [msg['message'] for msg in await cache.get_all('c1')] == ['first', 'second']
+
+    for cache in caches():
+        asyncio.run(scenario(cache))
+
+def test_read_racing_an_invalidate_is_not_cached():
+    async def scenario(cache):
+        generation = await cache.generation('c1')
+        await cache.invalidate('c1')
+        assert not await cache.put('c1', [message('deleted')], complete=True, generation=generation)
+        assert await cache.get_recent('c1', 1) is None
+
+    for cache in caches():
+        asyncio.run(scenario(cache))
+
+def test_append_after_fill_is_kept():
+    async def scenario(cache):
+        generation = await cache.generation('c1')
+        assert await cache.put('c1', [message('first')], complete=True, generation=generation)
+        await cache.append('c1', message('second'))
+        assert [msg['message'] for msg in await cache.get_recent('c1', 2)] == ['first', 'second']
+
+    for cache in caches():
+        asyncio.run(scenario(cache))
+
+def test_forgotten_generations_reject_older_reads(monkeypatch):
+    monkeypatch.setattr('app.services.message_cache.MAX_TRACKED_GENERATIONS', 2)
+    cache = MessageCache()
+
+    async def scenario():
+        generation = await cache.generation('c1')
+        await cache.append('c1', message('second'))
+        await cache.append('c2', message('other'))
+        await cache.append('c3', message('other'))
+        assert not await cache.put('c1', [message('first')], complete=True, generation=generation)
+
+    asyncio.run(scenario())
+
+class YieldingBackend(MemoryBackend):
+    # Gives other tasks a turn before every command, like a network backend
+    async def get(self, key):
+        await asyncio.sleep(0)
+        return await super().get(key)
+
+    async def incr(self, key):
+        await asyncio.sleep(0)
+        return await super().incr(key)
+
+    async def delete(self, *keys):
+        await asyncio.sleep(0)
+        await super().delete(*keys)
+
+    async def rpush(self, key, *values):
+        await asyncio.sleep(0)
+        return await super().rpush(key, *values)
+
+    async def expire(self, key, ttl):
+        await asyncio.sleep(0)
+        await super().expire(key, ttl)
+
+    async def replace_list(self, key, values, ttl, state_key, state):
+        await asyncio.sleep(0)
+        await super().replace_list(key, values, ttl, state_key, state)
+
+def test_concurrent_fills_do_not_duplicate_messages():
+    async def scenario():
+        cache = SharedMessageCache(YieldingBackend())
+        messages = [message(f"m{i}") for i in range(3)]
+        generation = await cache.generation('c1')
+        results = await asyncio.gather(
+            cache.put('c1', messages, complete=True, generation=generation),
+            cache.put('c1', messages, complete=True, generation=generation)
+        )
+        assert all(results)
+        assert [msg['message'] for msg in await cache.get_all('c1')] == ['m0', 'm1', 'm2']
+
+    asyncio.run(scenario())
+
+def test_cached_timestamps_are_datetimes():
+    async def scenario():
+        for cache in caches():
+            first, second = message('m0'), message('m1')
+            first['timestamp'] = datetime(2024, 1, 1, 12, 30)
+            second['timestamp'] = datetime(2024, 1, 2, 8, 15)
+            await cache.put('c1', [first], complete=True)
+            await cache.append('c1', second)
+            for cached in (await cache.get_all('c1'), await cache.get_recent('c1', 2)):
+                assert [msg['timestamp'] for msg in cached] == [first['timestamp'], second['timestamp']]
+
+    asyncio.run(scenario())
+
+def test_metadata_counts_towards_the_size_limit():
+    plain, annotated = message('m0'), message('m0')
+    annotated['metadata'] = {'attachment': 'x' * 10000}
+    assert MessageCache.message_size(annotated) > MessageCache.message_size(plain) + 10000
+
+    async def scenario():
+        cache = MessageCache(max_bytes=20000)
+        await cache.put('c1', [annotated], complete=True)
+        await cache.put('c2', [dict(annotated, _id=ObjectId())], complete=True)
+        assert cache.stats()['bytes'] <= 20000
+        assert await cache.get_all('c1') is None
+
+    asyncio.run(scenario())
+
+def test_quiet_lookups_leave_the_hit_rate_alone():
+    async def scenario():
+        for cache in caches():
+            await cache.put('c1', [message('m0')], complete=True)
+            assert await cache.get_recent('c1', 1, record_stats=False) is not None
+            assert await cache.get_recent('c2', 1, record_stats=False) is None
+            assert (cache.hits, cache.misses) == (0, 0)
+            await cache.get_recent('c1', 1)
+            assert (cache.hits, cache.misses) == (1, 0)
+
+    asyncio.run(scenario())
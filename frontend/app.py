@@ -2,10 +2,8 @@ import streamlit as st
 import requests
 import json
 from datetime import datetime
-import asyncio
-from collections import defaultdict
 import time
-import aiohttp
+from requests.adapters import HTTPAdapter
 
 # Page config must be first
 st.set_page_config(page_title="Chat Demo", layout="wide")
@@ -17,47 +15,79 @@ API_URL = "http://localhost:8000"
 # Configure request debouncing
 DEBOUNCE_TIME = 0.2
 
-# Initialize session state
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-    # Load existing messages from backend when initializing
-    async def load_messages():
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{API_URL}/chats/{st.session_state.conversation_id}") as response:
-                    if response.status == 200:
-                        messages = await response.json()
-                        st.session_state.messages = messages
-        except Exception as e:
-            st.error(f"Error loading messages: {str(e)}")
-    
-    asyncio.run(load_messages())
+# Messages rendered at once; older ones are shown on demand
+RENDER_WINDOW = 50
+
+# One pooled HTTP session shared across reruns
+@st.cache_resource
+def get_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-if 'message_cache' not in st.session_state:
-    st.session_state.message_cache = {}
+http = get_http_session()
+
+# Initialize session state
 if 'conversation_id' not in st.session_state:
     st.session_state.conversation_id = datetime.now().strftime("%Y%m%d%H%M%S")
 if 'user_id' not in st.session_state:
     st.session_state.user_id = "demo_user"
+if 'messages' not in st.session_state:
+    st.session_state.messages = []
 if 'last_request_time' not in st.session_state:
     st.session_state.last_request_time = 0
 if 'filtered_messages' not in st.session_state:
     st.session_state.filtered_messages = []
-if 'last_message_count' not in st.session_state:
-    st.session_state.last_message_count = 0
+if 'render_window' not in st.session_state:
+    st.session_state.render_window = RENDER_WINDOW
+
+def reset_conversation(conversation_id):
+    st.session_state.conversation_id = conversation_id
+    st.session_state.synced_conversation = conversation_id
+    st.session_state.messages = []
+    st.session_state.filtered_messages = []
+    st.session_state.last_message_id = None
+    st.session_state.etag = None
+    st.session_state.render_window = RENDER_WINDOW
+
+# Fetch only the messages added since the last sync
+def sync_messages():
+    params = {}
+    headers = {}
+    if st.session_state.last_message_id:
+        params["since"] = st.session_state.last_message_id
+    if st.session_state.etag:
+        headers["If-None-Match"] = st.session_state.etag
+    try:
+        response = http.get(f"{API_URL}/chats/{st.session_state.conversation_id}", params=params, headers=headers)
+        if response.status_code == 304:
+            return
+        if response.status_code != 200:
+            st.error(f"Error loading messages: {response.text}")
+            return
+        new_messages = response.json()
+        st.session_state.etag = response.headers.get("ETag")
+        if new_messages:
+            # Locally echoed messages are replaced by their stored copies
+            stored = [msg for msg in st.session_state.messages if msg.get("_id")]
+            st.session_state.messages = stored + new_messages
+            # Rows are ordered by timestamp, which clients set, so take the newest id
+            st.session_state.last_message_id = max(msg["_id"] for msg in new_messages)
+    except Exception as e:
+        st.error(f"Error loading messages: {str(e)}")
 
 # Sidebar with restored functionality
 with st.sidebar:
     st.header("Chat Settings")
     st.session_state.user_id = st.text_input("User ID", value=st.session_state.user_id)
-    st.session_state.conversation_id = st.text_input("Conversation ID", value=st.session_state.conversation_id)
-    
+    conversation_id = st.text_input("Conversation ID", value=st.session_state.conversation_id)
+
     if st.button("New Conversation"):
-        st.session_state.conversation_id = datetime.now().strftime("%Y%m%d%H%M%S")
-        st.session_state.messages = []
-        st.session_state.filtered_messages = []
+        reset_conversation(datetime.now().strftime("%Y%m%d%H%M%S"))
         st.rerun()
-    
+
     # Restored Search and Filter Section
     st.header("Search & Filter")
     search_query = st.text_input("Search messages", key="search_input")
@@ -66,76 +96,79 @@ with st.sidebar:
         start_date = st.date_input("From", None)
     with col2:
         end_date = st.date_input("To", None)
-    
+
+    # Filters run on the server, against the text and timestamp indexes
     if st.button("Apply Filters"):
-        filtered_messages = st.session_state.messages
+        params = {}
         if search_query:
-            filtered_messages = [
-                msg for msg in filtered_messages
-                if search_query.lower() in msg["message"].lower()
-            ]
+            params["search_query"] = search_query
         if start_date:
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            filtered_messages = [
-                msg for msg in filtered_messages
-                if datetime.fromisoformat(msg["timestamp"]) >= start_datetime
-            ]
+            params["start_date"] = datetime.combine(start_date, datetime.min.time()).isoformat()
         if end_date:
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-            filtered_messages = [
-                msg for msg in filtered_messages
-                if datetime.fromisoformat(msg["timestamp"]) <= end_datetime
-            ]
-        
-        st.session_state.filtered_messages = filtered_messages
-    
+            params["end_date"] = datetime.combine(end_date, datetime.max.time()).isoformat()
+        try:
+            response = http.get(f"{API_URL}/chats/{conversation_id}", params=params)
+            if response.status_code == 200:
+                st.session_state.filtered_messages = response.json()
+            else:
+                st.error(f"Error: {response.text}")
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
     # Restored Analysis Options
     st.header("Analysis Options")
     include_sentiment = st.checkbox("Include Sentiment Analysis")
     include_keywords = st.checkbox("Include Keyword Extraction")
-    
+
     if st.button("Generate Summary") and st.session_state.messages:
         with st.spinner("Generating summary..."):
             try:
-                async def generate_summary_async():
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(
-                            f"{API_URL}/chats/summarize",
-                            json={
-                                "conversation_id": st.session_state.conversation_id,
-                                "include_sentiment": include_sentiment,
-                                "include_keywords": include_keywords
-                            }
-                        ) as response:
-                            if response.status == 200:
-                                return await response.json()
-                            else:
-                                st.error(f"Error: {await response.text()}")
-                                return None
-                
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                summary = loop.run_until_complete(generate_summary_async())
-                
-                if summary:
+                response = http.post(
+                    f"{API_URL}/chats/summarize",
+                    json={
+                        "conversation_id": st.session_state.conversation_id,
+                        "include_sentiment": include_sentiment,
+                        "include_keywords": include_keywords
+                    }
+                )
+                if response.status_code == 200:
+                    summary = response.json()
                     st.success("Summary generated!")
                     st.text_area("Summary", summary.get("summary", ""), height=150)
                     if include_sentiment and "sentiment" in summary:
                         st.info(f"Sentiment: {summary['sentiment']}")
                     if include_keywords and "keywords" in summary:
                         st.info(f"Keywords: {', '.join(summary['keywords'])}")
+                else:
+                    st.error(f"Error: {response.text}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
 
+# Switching conversations starts a fresh sync
+if st.session_state.get('synced_conversation') != conversation_id:
+    reset_conversation(conversation_id)
+
+# A conditional request: unchanged conversations cost a 304 and no body
+sync_messages()
+
+def current_messages():
+    return st.session_state.filtered_messages if st.session_state.filtered_messages else st.session_state.messages
+
 # Main chat interface
 st.write("### Chat Messages")
+
+# Only the newest messages are rendered
+hidden = len(current_messages()) - st.session_state.render_window
+if hidden > 0 and st.button(f"Show earlier messages ({hidden} hidden)"):
+    st.session_state.render_window += RENDER_WINDOW
+    st.rerun()
+
 chat_container = st.empty()  # Use empty container for efficient updates
 
 # Function to update chat display efficiently
 def update_chat_display():
     with chat_container.container():
-        messages_to_display = st.session_state.filtered_messages if st.session_state.filtered_messages else st.session_state.messages
-        for msg in messages_to_display:
+        for msg in current_messages()[-st.session_state.render_window:]:
             with st.chat_message("user" if msg["user_id"] == st.session_state.user_id else "assistant"):
                 st.write(msg["message"])
 
@@ -143,19 +176,25 @@ def update_chat_display():
 update_chat_display()
 
 # Chat input at the bottom
-# Async function to send messages
-async def send_message_async(message):
+# Stream the bot reply over SSE, yielding tokens as they arrive
+def stream_message(message):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{API_URL}/chats", json=message) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    st.error(f"Error sending message: {await response.text()}")
-                    return None
+        with http.post(f"{API_URL}/chats/stream", json=message, stream=True) as response:
+            if response.status_code != 200:
+                st.error(f"Error sending message: {response.text}")
+                return
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "token":
+                        yield data["text"]
+                    elif event == "error":
+                        st.error(f"Error sending message: {data['detail']}")
     except Exception as e:
         st.error(f"Network error: {str(e)}")
-        return None
 
 # Handle chat input
 if prompt := st.chat_input("Type your message here"):
@@ -168,27 +207,23 @@ if prompt := st.chat_input("Type your message here"):
             "conversation_id": st.session_state.conversation_id,
             "user_id": st.session_state.user_id,
             "message": prompt,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.utcnow().isoformat(),
             "metadata": {}
         }
+        # Echo locally until the stored copy arrives with the next sync
         st.session_state.messages.append(message)
         update_chat_display()
-        message_id = f"{st.session_state.conversation_id}_{len(st.session_state.messages)}"
-        st.session_state.message_cache[message_id] = message
-        
-        async def process_message():
-            bot_response = await send_message_async(message)
-            if bot_response:
-                st.session_state.messages.append(bot_response)
-                if message_id in st.session_state.message_cache:
-                    del st.session_state.message_cache[message_id]
-                update_chat_display()
-        
-        asyncio.run(process_message())
+
+        # Render partial output while the reply is generated
+        with st.chat_message("assistant"):
+            st.write_stream(stream_message(message))
+
+        # Pick up the stored message and reply
+        sync_messages()
 
 # Status information
 st.sidebar.markdown("---")
 st.sidebar.markdown(f"**Conversation ID:** {st.session_state.conversation_id}")
 st.sidebar.markdown(f"**Total Messages:** {len(st.session_state.messages)}")
 if st.session_state.filtered_messages:
-    st.sidebar.markdown(f"**Filtered Messages:** {len(st.session_state.filtered_messages)}")
\ No newline at end of file
+    st.sidebar.markdown(f"**Filtered Messages:** {len(st.session_state.filtered_messages)}")